@@ -8,98 +8,297 @@ endif
 let g:loaded_yaifa_auto = 1
 
 let s:script_dir = expand('<sfile>:p:h:h')
+let s:options = ['expandtab', 'shiftwidth', 'softtabstop', 'tabstop']
+" Background analysis in progress, by buffer number.
+let s:tasks = get(s:, 'tasks', {})
 
-function! s:is_continued_line(previous, current, filetype) "{{{
-  if a:filetype ==? 'vim'
-    return a:current =~# '\m^\s*\\'
-  "elseif ...
-  " TODO: Consider other syntaxes for line continuation
-  " https://en.wikipedia.org/wiki/Comparison_of_programming_languages_(syntax)
-  else
-    return a:previous =~# '\m\\$'
-  endif
-endfunction "}}}
+if has('patch-8.2.0868') || has('nvim-0.5')
+  function! s:indent_length(line) "{{{
+    return len(a:line) - len(trim(a:line, " \t", 1))
+  endfunction "}}}
+else
+  function! s:indent_length(line) "{{{
+    return matchend(a:line, '\m^\s*')
+  endfunction "}}}
+endif
 
-function! s:is_comment(line, filetype) "{{{
-  if a:filetype ==# 'vim'
-    return a:line =~# '\m^\s*"'
-  "elseif ...
-  " TODO: Consider other syntaxes for comments
-  " https://en.wikipedia.org/wiki/Comparison_of_programming_languages_(syntax)
-  else
-    return a:line =~# '\m^\s*\%(/\*\|\*\|#\|//\)'
+function! s:new_line(line, linenr) "{{{
+  " Only lines that are actually visited get their state built. The leading
+  " white space is classified from the position of the first space and the
+  " last tab, no regex needed. Every kind of indentation returns its own dict
+  " literal, since in Vim script each extra statement costs more than that.
+  " Tabs count as 8 columns for the length, no matter where they are.
+  let size = s:indent_length(a:line)
+  if size == 0
+    return {'line': a:line, 'linenr': a:linenr, 'indent': '', 'delta': '',
+          \ 'tab': 0, 'space': 0, 'mixed': 0, 'crazy': 0,
+          \ 'tabs': 0, 'spaces': 0, 'length': 0,
+          \ 'blank': empty(a:line), 'skipped': 0}
+  endif
+  let indent = strpart(a:line, 0, size)
+  let last_tab = strridx(indent, "\t")
+  if last_tab < 0
+    " Spaces, with less than 8 this line could also use mixed indentation.
+    return {'line': a:line, 'linenr': a:linenr, 'indent': indent, 'delta': '',
+          \ 'tab': 0, 'space': 1, 'mixed': size < 8, 'crazy': 0,
+          \ 'tabs': 0, 'spaces': size, 'length': size,
+          \ 'blank': size == len(a:line), 'skipped': 0}
+  endif
+  let first_space = stridx(indent, ' ')
+  if first_space < 0
+    " Tabs.
+    return {'line': a:line, 'linenr': a:linenr, 'indent': indent, 'delta': '',
+          \ 'tab': 1, 'space': 0, 'mixed': 0, 'crazy': 0,
+          \ 'tabs': size, 'spaces': 0, 'length': size * 8,
+          \ 'blank': size == len(a:line), 'skipped': 0}
+  elseif last_tab < first_space
+    " Tabs followed by spaces.
+    return {'line': a:line, 'linenr': a:linenr, 'indent': indent, 'delta': '',
+          \ 'tab': 0, 'space': 0, 'mixed': 1, 'crazy': 0,
+          \ 'tabs': first_space, 'spaces': size - first_space,
+          \ 'length': size + first_space * 7,
+          \ 'blank': size == len(a:line), 'skipped': 0}
   endif
+  " A space before a tab.
+  return {'line': a:line, 'linenr': a:linenr, 'indent': indent, 'delta': '',
+        \ 'tab': 0, 'space': 0, 'mixed': 0, 'crazy': 1,
+        \ 'tabs': 0, 'spaces': 0,
+        \ 'length': size + 7 * (size - len(substitute(indent, '\t', '', 'g'))),
+        \ 'blank': size == len(a:line), 'skipped': 0}
 endfunction "}}}
 
-function! yaifa#analyze_lines(lines, filetype, defaults) "{{{
-  let times = []
-  call add(times, reltime())
+function! s:scanner_new(filetype, defaults) "{{{
   let defaults = {'type': 'space', 'indent': 4, 'tabstop': 8,
-        \ 'max_lines': 0}
+        \ 'max_lines': 0, 'margin': 0}
   call extend(defaults, a:defaults, 'force')
-  let previous = {'line': '', 'linenr': 0, 'indent': 'X', 'delta': '',
+  let scanner = {}
+  let scanner.start_time = reltime()
+  let scanner.filetype = a:filetype
+  let scanner.syntax = get(defaults, 'syntax', {})
+  if empty(scanner.syntax)
+    let scanner.syntax = yaifa#syntax#get(a:filetype)
+  endif
+  let scanner.defaults = defaults
+  let scanner.previous = {'line': '', 'linenr': 0, 'indent': 'X', 'delta': '',
           \ 'tab': 0, 'space': 0, 'mixed': 0, 'crazy': 0,
-          \ 'tabs': 0, 'spaces': 0, 'length': 0, 'skipped': 0}
-  let lines = map(copy(a:lines), 'extend(deepcopy(previous), '
-        \ . '{''line'': v:val, ''linenr'': v:key + 1, '
-        \ . '''indent'': matchstr(v:val, ''\m^\s*'')}, ''force'')')
-  let mixed = {}
-  let space = {}
-  let tab = 0
-  let processed_count = 0
-  let ignored_count = 0
-  let hint_count = 0
-  let max_lines = defaults.max_lines
-  call add(times, reltime())
-  while !empty(lines) && (max_lines == 0
+          \ 'tabs': 0, 'spaces': 0, 'length': 0, 'blank': 0,
+          \ 'skipped': 0}
+  let scanner.mixed = yaifa#histogram#new()
+  let scanner.space = yaifa#histogram#new()
+  " The hints that went to both space and mixed.
+  let scanner.either = yaifa#histogram#new()
+  let scanner.tab = 0
+  " End pattern of the block the scan is in, see s:scanner_feed().
+  let scanner.block = ''
+  let scanner.processed_count = 0
+  let scanner.ignored_count = 0
+  let scanner.hint_count = 0
+  " Set when the verdict can not change anymore.
+  let scanner.settled = 0
+  " Number of the last line fed to the scanner.
+  let scanner.linenr = 0
+  " Set when the lines come from the current buffer, then the buffer can be
+  " used to go faster.
+  let scanner.native = 0
+  " Seconds spent on every phase, only measured when profiling.
+  let scanner.profile = get(defaults, 'profile', get(g:, 'yaifa_profile', 0))
+  let scanner.stats = {'materialize': 0.0, 'classify': 0.0, 'match': 0.0,
+        \ 'decide': 0.0, 'syntax_lookups': 0}
+  " Ask the syntax highlighting about the lines that could give hints, see
+  " s:in_comment_or_string().
+  let scanner.synid = get(defaults, 'synid', 0)
+  let scanner.synid_budget = get(defaults, 'synid_budget', 20) / 1000.0
+  let scanner.synid_time = 0.0
+  " Which pass of the analysis the scanner is on, see s:escalate().
+  let quick_lines = get(defaults, 'quick_lines', 0)
+  if quick_lines > 0
+        \ && (defaults.max_lines == 0 || quick_lines < defaults.max_lines)
+    let scanner.stage = 'quick'
+    let scanner.deep_lines = defaults.max_lines
+    let defaults.max_lines = quick_lines
+  else
+    let scanner.stage = 'full'
+  endif
+  return scanner
+endfunction "}}}
+
+" Whether the syntax highlighting can be used to scan the current buffer.
+" Its answers are kept until the buffer changes.
+function! s:synid_ready(scanner) "{{{
+  if !a:scanner.synid || !exists('b:current_syntax')
+        \ || a:scanner.synid_time > a:scanner.synid_budget
+    return 0
+  endif
+  if get(get(b:, 'yaifa_synid_cache', {}), 'tick', -1) != b:changedtick
+    let b:yaifa_synid_cache = {'tick': b:changedtick, 'lines': {}}
+  endif
+  let a:scanner.synid_lines = b:yaifa_synid_cache.lines
+  return 1
+endfunction "}}}
+
+" Whether the first non-blank character of the line is highlighted as a
+" comment or a string. Gives up for the rest of the scan once the time
+" budget is spent.
+function! s:in_comment_or_string(scanner, linenr, line) "{{{
+  if has_key(a:scanner.synid_lines, a:linenr)
+    return a:scanner.synid_lines[a:linenr]
+  endif
+  if a:scanner.synid_time > a:scanner.synid_budget
+    return 0
+  endif
+  let start = reltime()
+  let name = synIDattr(synIDtrans(synID(a:linenr, match(a:line, '\S') + 1,
+        \ 1)), 'name')
+  let a:scanner.synid_time += reltimefloat(reltime(start))
+  let a:scanner.stats.syntax_lookups += 1
+  let a:scanner.synid_lines[a:linenr] = name ==# 'Comment' || name ==# 'String'
+  return a:scanner.synid_lines[a:linenr]
+endfunction "}}}
+
+" When the quick pass used up its line budget, go on with the whole budget if
+" the verdict is not clear enough. A verdict settled by the margin is clear
+" enough. Returns 1 if it goes on.
+function! s:escalate(scanner) "{{{
+  if a:scanner.stage !=# 'quick' || a:scanner.settled
+        \ || !s:scanner_done(a:scanner)
+    return 0
+  endif
+  let confidence = s:confidence(a:scanner.space, a:scanner.mixed,
+        \ a:scanner.either, a:scanner.tab, a:scanner.hint_count)
+  if confidence >= get(a:scanner.defaults, 'confidence', 0.6)
+    return 0
+  endif
+  2DebugYaifa printf('Quick pass not clear enough after %s lines (%.2f)',
+        \ a:scanner.processed_count, confidence)
+  let a:scanner.stage = 'deep'
+  let a:scanner.defaults.max_lines = a:scanner.deep_lines
+  return 1
+endfunction "}}}
+
+function! s:scanner_done(scanner) "{{{
+  let max_lines = a:scanner.defaults.max_lines
+  return a:scanner.settled || max_lines != 0
+        \ && (a:scanner.processed_count - a:scanner.ignored_count) >= max_lines
+endfunction "}}}
+
+" Scan the given lines, which follow the ones already seen by the scanner,
+" until they run out or the line budget is spent. Returns 1 when the scanner
+" wants more lines.
+function! s:scanner_feed(scanner, lines) "{{{
+  let comment = a:scanner.syntax.comment
+  let continues = a:scanner.syntax.continues
+  let continued = a:scanner.syntax.continued
+  let opens = a:scanner.syntax.opens
+  " Matches comments and lines that open a block.
+  let special = a:scanner.syntax.special
+  " Pattern that ends the block comment, string or heredoc the last line
+  " left open, if any.
+  let block = a:scanner.block
+  let debug = get(g:, 'yaifa_debug', 0)
+  let profile = a:scanner.profile
+  let stats = a:scanner.stats
+  let native = a:scanner.native
+  let synid = native && s:synid_ready(a:scanner)
+  let previous = a:scanner.previous
+  let mixed = a:scanner.mixed
+  let space = a:scanner.space
+  let either = a:scanner.either
+  let tab = a:scanner.tab
+  let processed_count = a:scanner.processed_count
+  let ignored_count = a:scanner.ignored_count
+  let hint_count = a:scanner.hint_count
+  let max_lines = a:scanner.defaults.max_lines
+  " The lines left could overturn the verdict only up to the end of the deep
+  " pass, see s:escalate().
+  let budget = a:scanner.stage ==# 'quick' ? a:scanner.deep_lines : max_lines
+  let margin = a:scanner.defaults.margin
+  let settled = a:scanner.settled
+  let checked_count = hint_count
+  let linenr = a:scanner.linenr
+  " Keep the state after every line and the hint it gave, if asked to.
+  let track = has_key(a:scanner, 'kinds')
+  let hint = ''
+  let last_index = len(a:lines)
+  let index = 0
+  while !settled && index < last_index && (max_lines == 0
         \ || (processed_count -ignored_count) < max_lines)
     let processed_count += 1
-    let current = remove(lines, 0)
+    let line = a:lines[index]
+    let index += 1
+    let linenr += 1
     let skip_msg = ''
-    if s:is_continued_line(previous.line, current.line, a:filetype)
+    if profile
+      let phase_time = reltime()
+    endif
+    if !empty(block)
+      " Nothing inside the block says anything about the indentation.
+      let skip_msg = 'inside a block'
+      if line =~# block
+        let block = ''
+      endif
+      if debug
+        let current = s:new_line(line, linenr)
+      endif
+    elseif previous.line =~# continues || line =~# continued
       let skip_msg = 'line continuation'
       " Use the properties of the "main" line since that's the one with the
       " correct indentation.
-      let current_line = current.line
       let current = copy(previous)
-      let current.line = current_line
+      let current.line = line
       let previous = current
-    elseif s:is_comment(current.line, a:filetype)
-      let skip_msg = 'comment'
+    elseif line =~# special
+      if line =~# opens
+        let block = yaifa#syntax#block_end(line, a:scanner.syntax.blocks)
+      endif
+      if line =~# comment
+        let skip_msg = 'comment'
+        if debug
+          " Only needed for the debug output.
+          let current = s:new_line(line, linenr)
+        endif
+      endif
+    endif
+    if profile
+      let stats.classify += reltimefloat(reltime(phase_time))
+      let phase_time = reltime()
     endif
     if !empty(skip_msg)
       " This is meaningless line, just skip it.
       3DebugYaifa s:l2str(current)
       3DebugYaifa printf('Hint: none (%s)', skip_msg)
       let ignored_count += 1
+      if track
+        call add(a:scanner.states, previous)
+        call add(a:scanner.kinds, '')
+        call add(a:scanner.blocks, block)
+      endif
       continue
     endif
-    let current.length =
-          \ len(substitute(current.indent, '\t', repeat(' ', 8), 'g'))
-    " Determine indentation type.
-    if current.indent =~# '\m^ \+$'
-      let current.space = 1
-      let current.spaces = len(matchstr(current.indent, '\m^\zs *'))
-      if current.spaces < 8
-        " This line could also use mixed indentation.
-        let current.mixed = 1
-      endif
-    elseif current.indent =~# '\m^\t\+ \+$'
-      let current.mixed = 1
-      let current.spaces = len(matchstr(current.indent, '\m^\t*\zs *'))
-      let current.tabs = len(matchstr(current.indent, '\m^\t*'))
-    elseif current.indent =~# '\m^\t\+$'
-      let current.tab = 1
-      let current.tabs = len(matchstr(current.indent, '\m^\t*'))
-    elseif current.indent =~# '\m \t'
-      let current.crazy = 1
+    let current = s:new_line(line, linenr)
+    if profile
+      let stats.materialize += reltimefloat(reltime(phase_time))
+      let phase_time = reltime()
     endif
     3DebugYaifa s:l2str(current)
     let current.delta = current.length - previous.length
-    if empty(current.line) || current.line =~# '\m^\s*$'
+    if current.blank
       " Skip empty or blank lines
       let current.skipped = 1
       3DebugYaifa printf('Hint: none (%3s:empty line)', current.delta)
+      if native && !track && index < last_index
+        " Let Vim find the end of this run of blank lines and jump to the last
+        " one, the lines in between would leave things just like this one.
+        let next = nextnonblank(linenr + 1)
+        let run = (next ? next : line('$') + 1) - linenr - 2
+        let run = min([run, last_index - index, max_lines == 0 ? run
+              \ : max_lines - (processed_count - ignored_count)])
+        if run > 0
+          let index += run
+          let linenr += run
+          let processed_count += run
+          3DebugYaifa printf('Hint: none (%s more empty lines)', run)
+        endif
+      endif
     elseif previous.indent ==# current.indent
       " Skip lines without indentation change
       3DebugYaifa printf('Hint: none (%3s: same indent)', current.delta)
@@ -119,101 +318,273 @@ function! yaifa#analyze_lines(lines, filetype, defaults) "{{{
     elseif (current.delta <= 1) || (current.delta > 8)
       " Ignore indent change too small or too big
       3DebugYaifa printf('Hint: none (%3s:wrong change size)', current.delta)
+    elseif synid && s:in_comment_or_string(a:scanner, linenr, line)
+      " Meaningless like the comments above, but it takes the syntax
+      " highlighting to tell. Only asked about lines that would give a hint.
+      3DebugYaifa printf('Hint: none (%3s:comment or string)', current.delta)
+      let ignored_count += 1
+      continue
     elseif (previous.length == 0 || previous.tab) && current.tab
       " Indent change hints at tabs
       " Increment tab count
       let tab += 1
       let hint_count += 1
+      let hint = 'tab'
       3DebugYaifa printf('Hint: tab   (%3s)', current.delta)
     elseif (previous.length == 0 || previous.space) && current.space
           \ && !current.mixed
       " Indent change hints at spaces
       " Increment space count
-      let space[current.delta] = get(space, current.delta, 0) + 1
+      let space[current.delta] += 1
       let hint_count += 1
+      let hint = 'space'
       3DebugYaifa printf('Hint: space (%3s)', current.delta)
     elseif (previous.mixed && previous.space || previous.length == 0)
           \ && current.space && current.mixed
       " Indent change hints at spaces or mixed
       " Increment space and mixed count
-      let space[current.delta] = get(space, current.delta, 0) + 1
-      let mixed[current.delta] = get(mixed, current.delta, 0) + 1
+      let space[current.delta] += 1
+      let mixed[current.delta] += 1
+      let either[current.delta] += 1
       let hint_count += 1
+      let hint = 'either'
       3DebugYaifa printf('Hint: either(%3s)', current.delta)
     elseif previous.tab && current.mixed && (previous.tabs == current.tabs)
       " Indent change hints at mixed
       " Increment mixed count
-      let mixed[current.delta] = get(mixed, current.delta, 0) + 1
+      let mixed[current.delta] += 1
       let hint_count += 1
+      let hint = 'mixed'
       3DebugYaifa printf('Hint: mixed (%3s)', current.delta)
     elseif previous.mixed && current.tab
           \ && (previous.tabs == current.tabs - 1)
       " Indent change hints at mixed
       " Increment mixed count
-      let mixed[current.delta] = get(mixed, current.delta, 0) + 1
+      let mixed[current.delta] += 1
       let hint_count += 1
+      let hint = 'mixed'
       3DebugYaifa printf('Hint: mixed (%3s)', current.delta)
     elseif previous.mixed && current.mixed && (previous.tabs == current.tabs)
       " Indent change hints at mixed
       " Increment mixed count
-      let mixed[current.delta] = get(mixed, current.delta, 0) + 1
+      let mixed[current.delta] += 1
       let hint_count += 1
+      let hint = 'mixed'
       3DebugYaifa printf('Hint: mixed (%3s)', current.delta)
     else
       " Nothing to do here
       3DebugYaifa printf('Hint: none  (%3s)', current.delta)
     endif
+    if profile
+      let stats.match += reltimefloat(reltime(phase_time))
+    endif
     let previous = current
+    if track
+      call add(a:scanner.states, current)
+      call add(a:scanner.kinds, hint)
+      call add(a:scanner.blocks, block)
+      let hint = ''
+    endif
+    if hint_count > checked_count
+      let checked_count = hint_count
+      let remaining = budget ? budget - (processed_count - ignored_count)
+            \ : -1
+      " No candidate can have more hints than hint_count, don't bother to
+      " look closer until it is big enough to settle anything.
+      if (margin > 0 && hint_count >= margin)
+            \ || (remaining >= 0 && hint_count >= remaining * 1.1 + 1)
+        if profile
+          let phase_time = reltime()
+        endif
+        let settled =
+              \ s:is_settled(space, mixed, either, tab, remaining, margin)
+        if profile
+          let stats.decide += reltimefloat(reltime(phase_time))
+        endif
+        if settled
+          2DebugYaifa printf('Verdict settled after %s lines', processed_count)
+        endif
+      endif
+    endif
   endwhile
-  let time = reltimestr(reltime(remove(times, -1)))
-  2DebugYaifa printf('Time taken to analyze all lines: %s', time)
-  let max_space = max(space)
-  let max_mixed = max(mixed)
-  let max_tab   = tab
-  let result = {'type': '', 'indent': 0}
+  let a:scanner.previous = previous
+  let a:scanner.block = block
+  let a:scanner.tab = tab
+  let a:scanner.processed_count = processed_count
+  let a:scanner.ignored_count = ignored_count
+  let a:scanner.hint_count = hint_count
+  let a:scanner.settled = settled
+  let a:scanner.linenr = linenr
+  if s:escalate(a:scanner) && index < last_index
+    " The rest of the lines go to the deep pass.
+    return s:scanner_feed(a:scanner, a:lines[index :])
+  endif
+  return !s:scanner_done(a:scanner)
+endfunction "}}}
+
+" Find the winning indentation, returns [type, indent, hints] where type is
+" empty if there is no guess.
+function! s:leader(space, mixed, tab) "{{{
+  let max_space = max(a:space)
+  let max_mixed = max(a:mixed)
+  let max_tab   = a:tab
   if max_space * 1.1 >= max_mixed && max_space >= max_tab
     " Go with spaces
-    let line_count = 0
-    let indent = 0
-    for i in range(8, 1, -1)
-      if get(space, i, 0) > floor(line_count * 1.1)
-        " Give preference to higher indentation
-        let indent = i
-        let line_count = space[i]
-      endif
-    endfor
-    if indent == 0
-      " No guess on size, return defaults
-      let result.type = defaults.type
-      let result.indent = defaults.indent
-    else
-      let result.type = 'space'
-      let result.indent = indent
-    endif
+    let type = 'space'
+    let counts = a:space
   elseif max_mixed > max_tab
     " Go with mixed
-    let line_count = 0
-    let indent = 0
-    for i in range(8, 1, -1)
-      if get(mixed, i, 0) > floor(line_count * 1.1)
-        " Give preference to higher indentation
-        let indent = i
-        let line_count = mixed[i]
-      endif
-    endfor
-    if indent == 0
-      " No guess on size, return defaults
-      let result.type = defaults.type
-      let result.indent = defaults.indent
-    else
-      let result.type = 'mixed'
-      let result.indent = indent
-    endif
+    let type = 'mixed'
+    let counts = a:mixed
   else
     " Go with tabs
+    return ['tab', 0, a:tab]
+  endif
+  let line_count = 0
+  let indent = 0
+  for i in range(8, 2, -1)
+    if counts[i] > floor(line_count * 1.1)
+      " Give preference to higher indentation
+      let indent = i
+      let line_count = counts[i]
+    endif
+  endfor
+  if indent == 0
+    return ['', 0, 0]
+  endif
+  return [type, indent, line_count]
+endfunction "}}}
+
+" The hints of the strongest candidate after the leader, of the given type
+" and indent. The "either" hints count for both spaces and mixed
+" indentation of the same size, so they are on the leader's side: only the
+" ones of the other type alone are against it.
+function! s:rival(space, mixed, either, tab, type, indent) "{{{
+  let space = copy(a:space)
+  let mixed = copy(a:mixed)
+  let tab = a:tab
+  if a:type ==# 'space'
+    let space[a:indent] = 0
+    let mixed[a:indent] -= a:either[a:indent]
+  elseif a:type ==# 'mixed'
+    let mixed[a:indent] = 0
+    let space[a:indent] -= a:either[a:indent]
+  else
+    let tab = 0
+  endif
+  return max(space + mixed + [tab])
+endfunction "}}}
+
+" How sure the verdict is, from 0 (no hints or a tie) to almost 1 (lots of
+" hints and no rivals): the lead over the strongest rival as a fraction of
+" all the hints, plus a few more so that a handful of hints is not enough.
+" Once there are hints for the other type alone at the same size, the
+" "either" hints could go both ways and count for the rival too.
+function! s:confidence(space, mixed, either, tab, hint_count) "{{{
+  let [type, indent, leader_count] = s:leader(a:space, a:mixed, a:tab)
+  if empty(type)
+    return 0.0
+  endif
+  let rival_count = s:rival(a:space, a:mixed, a:either, a:tab, type, indent)
+  if type !=# 'tab'
+    let other = type ==# 'space' ? a:mixed : a:space
+    if other[indent] > a:either[indent]
+      let rival_count = max([rival_count, other[indent]])
+    endif
+  endif
+  let lead = leader_count - rival_count
+  return max([0, lead]) / (a:hint_count + 5.0)
+endfunction "}}}
+
+" Is the verdict settled? That is when the remaining line budget is not
+" enough to overturn the leader or, if margin is not zero, when the leader is
+" at least margin hints ahead of every other candidate.
+function! s:is_settled(space, mixed, either, tab, remaining, margin) "{{{
+  let [type, indent, leader_count] = s:leader(a:space, a:mixed, a:tab)
+  if empty(type)
+    return 0
+  endif
+  if a:margin > 0 && leader_count
+        \ - s:rival(a:space, a:mixed, a:either, a:tab, type, indent)
+        \ >= a:margin
+    return 1
+  endif
+  " s:leader() weighs the whole counts, "either" hints included, so this
+  " must too to never change the result: no hint is left out of the rival.
+  let rival_count = s:rival(a:space, a:mixed, yaifa#histogram#new(), a:tab,
+        \ type, indent)
+  " Every remaining line could add a hint to the strongest rival.
+  return a:remaining >= 0
+        \ && leader_count >= (rival_count + a:remaining) * 1.1 + 1
+endfunction "}}}
+
+" Turn the hints into a result.
+function! yaifa#verdict(hints, defaults) "{{{
+  let result = {'type': '', 'indent': 0}
+  let [type, indent, line_count] =
+        \ s:leader(a:hints.space, a:hints.mixed, a:hints.tab)
+  if empty(type)
+    " No guess on size, return defaults
+    let result.type = a:defaults.type
+    let result.indent = a:defaults.indent
+  elseif type ==# 'tab'
     let result.type = 'tab'
-    let result.indent = defaults.tabstop
+    let result.indent = a:defaults.tabstop
+  else
+    let result.type = type
+    let result.indent = indent
   endif
+  return result
+endfunction "}}}
+
+" Scan the lines after the given state (an empty dict for the start of the
+" file) and block and keep what every line left behind: the scanner's
+" states[i], kinds[i] and blocks[i] are the state after the i-th line, the
+" hint it gave, if any, and the block it left open, if any.
+function! yaifa#track(filetype, previous, block, linenr, lines) "{{{
+  let scanner = s:scanner_new(a:filetype, {})
+  if !empty(a:previous)
+    let scanner.previous = a:previous
+  endif
+  let scanner.block = a:block
+  let scanner.linenr = a:linenr
+  let scanner.states = []
+  let scanner.kinds = []
+  let scanner.blocks = []
+  call s:scanner_feed(scanner, a:lines)
+  return scanner
+endfunction "}}}
+
+function! s:scanner_result(scanner) "{{{
+  let time = reltimestr(reltime(a:scanner.start_time))
+  2DebugYaifa printf('Time taken to analyze all lines: %s', time)
+  let defaults = a:scanner.defaults
+  let space = a:scanner.space
+  let mixed = a:scanner.mixed
+  let tab = a:scanner.tab
+  let processed_count = a:scanner.processed_count
+  let hint_count = a:scanner.hint_count
+  let max_space = max(space)
+  let max_mixed = max(mixed)
+  let max_tab   = tab
+  let evidence = {'tab': tab, 'space': copy(space), 'mixed': copy(mixed),
+        \ 'count': hint_count, 'lines': processed_count,
+        \ 'ignored': a:scanner.ignored_count}
+  let decide_time = reltime()
+  let result = yaifa#verdict(evidence, defaults)
+  let evidence.confidence =
+        \ s:confidence(space, mixed, a:scanner.either, tab, hint_count)
+  let result.lines = processed_count
+  let result.evidence = evidence
+  let result.stage = a:scanner.stage
+  let stats = copy(a:scanner.stats)
+  if a:scanner.profile
+    let stats.decide += reltimefloat(reltime(decide_time))
+  endif
+  let stats.total = reltimefloat(reltime(a:scanner.start_time))
+  let stats.lines = processed_count
+  let result.stats = stats
+  call yaifa#stats_add(stats)
   if get(g:, 'yaifa_debug', 0) > 1
     " Print some info for debugging
     2DebugYaifa printf('Processed lines count: %s', processed_count)
@@ -221,33 +592,169 @@ function! yaifa#analyze_lines(lines, filetype, defaults) "{{{
     if tab > 0
       2DebugYaifa printf('    tab  (8) => %s', tab)
     endif
-    for key in keys(space)
-      if space[key] > 0
-        2DebugYaifa printf('    space(%s) => %s', key, space[key])
+    for delta in range(2, 8)
+      if space[delta] > 0
+        2DebugYaifa printf('    space(%s) => %s', delta, space[delta])
       endif
     endfor
-    for key in keys(mixed)
-      if mixed[key] > 0
-        2DebugYaifa printf('    mixed(%s) => %s', key, mixed[key])
+    for delta in range(2, 8)
+      if mixed[delta] > 0
+        2DebugYaifa printf('    mixed(%s) => %s', delta, mixed[delta])
       endif
     endfor
     2DebugYaifa  'max_space: ' . max_space
     2DebugYaifa  'max_mixed: ' . max_mixed
     2DebugYaifa  'max_tab: ' . max_tab
   endif
-  let time = reltimestr(reltime(remove(times, -1)))
+  let time = reltimestr(reltime(a:scanner.start_time))
   1DebugYaifa printf('Time taken to guess: %s', time)
   1DebugYaifa 'Result: ' . string(result)
   return result
 endfunction "}}}
 
-function! yaifa#magic(bufnr) "{{{
-  let lines = getline(1, '$')
-  let default_shiftwidth =
-        \ get(b:, 'yaifa_shiftwidth', get(g:, 'yaifa_shiftwidth', 4))
-  let default_tabstop = get(b:, 'yaifa_tabstop', get(g:, 'yaifa_tabstop', 8))
-  let default_expandtab =
-        \ get(b:, 'yaifa_expandtab', get(g:, 'yaifa_expandtab', 1))
+" Add the given stats to the totals in g:yaifa_stats.
+function! yaifa#stats_add(stats) "{{{
+  if !exists('g:yaifa_stats')
+    let g:yaifa_stats = {'runs': 0, 'lines': 0, 'total': 0.0,
+          \ 'materialize': 0.0, 'classify': 0.0, 'match': 0.0, 'decide': 0.0,
+          \ 'apply': 0.0, 'syntax_lookups': 0}
+  endif
+  if has_key(a:stats, 'total')
+    let g:yaifa_stats.runs += 1
+  endif
+  for [name, value] in items(a:stats)
+    let g:yaifa_stats[name] = get(g:yaifa_stats, name, 0) + value
+  endfor
+endfunction "}}}
+
+" The result of the scanner, worked out only the first time so the run is
+" added to g:yaifa_stats once.
+function! s:scanner_finish(scanner) "{{{
+  if !has_key(a:scanner, 'result')
+    let a:scanner.result = s:scanner_result(a:scanner)
+  endif
+  return a:scanner.result
+endfunction "}}}
+
+" Returns an analyzer for lines that come a few at a time, e.g.: from a job
+" or a timer. It keeps everything it needs from one call to the next:
+"   feed(lines)  Analyze the lines that follow the ones fed so far. Returns
+"                1 while it wants more lines.
+"   finish()     Returns the result, like yaifa#analyze_lines() does. Later
+"                calls return the same result.
+function! yaifa#analyzer_new(filetype, defaults) "{{{
+  let scanner = s:scanner_new(a:filetype, a:defaults)
+  return {'feed': function('s:scanner_feed', [scanner]),
+        \ 'finish': function('s:scanner_finish', [scanner])}
+endfunction "}}}
+
+function! yaifa#analyze_lines(lines, filetype, defaults) "{{{
+  let analyzer = yaifa#analyzer_new(a:filetype, a:defaults)
+  call analyzer.feed(a:lines)
+  return analyzer.finish()
+endfunction "}}}
+
+" Like yaifa#analyze_lines(), but the lines are pulled from the buffer in
+" blocks of defaults.chunk_size lines only while the scanner asks for more, so
+" the cost depends on the lines analyzed and not on the size of the buffer.
+" Runs of blank lines in the current buffer are skipped with nextnonblank().
+function! yaifa#analyze_buffer(bufnr, filetype, defaults) "{{{
+  let scanner = s:scanner_new(a:filetype, a:defaults)
+  let scanner.native = a:bufnr == bufnr('%')
+  let chunk_size = get(a:defaults, 'chunk_size', 256)
+  let first = 1
+  while 1
+    let lines = getbufline(a:bufnr, first, first + chunk_size - 1)
+    if empty(lines) || !s:scanner_feed(scanner, lines)
+          \ || len(lines) < chunk_size
+      break
+    endif
+    let first += chunk_size
+  endwhile
+  return s:scanner_result(scanner)
+endfunction "}}}
+
+function! s:slice(lines, first, last) "{{{
+  return a:lines[a:first - 1 : a:last - 1]
+endfunction "}}}
+
+" Scan defaults.windows windows evenly spread from the top to the bottom of
+" the lines, every one with its own budget of defaults.window_lines lines, and
+" decide on all of their hints together. Get(first, last) returns the lines in
+" that range and total is the number of lines.
+function! s:analyze_sampled(Get, total, filetype, defaults, native) "{{{
+  let start_time = reltime()
+  " A single window scans from the top.
+  let windows = max([1, get(a:defaults, 'windows', 5)])
+  let window_lines = get(a:defaults, 'window_lines', 200)
+  let chunk_size = get(a:defaults, 'chunk_size', 256)
+  let merged = s:scanner_new(a:filetype, a:defaults)
+  let defaults = extend(copy(merged.defaults),
+        \ {'max_lines': window_lines, 'margin': 0, 'quick_lines': 0})
+  let starts = [1]
+  for i in range(1, windows - 1)
+    call add(starts, 1 + i * max([0, a:total - window_lines]) / (windows - 1))
+  endfor
+  call uniq(starts)
+  for i in range(len(starts))
+    let start = starts[i]
+    " On short buffers the windows would overlap, each one stops where the
+    " next starts so no line is counted twice.
+    let last = i + 1 < len(starts) ? starts[i + 1] - 1 : a:total
+    let scanner = s:scanner_new(a:filetype, defaults)
+    let scanner.native = a:native
+    let scanner.linenr = start - 1
+    let first = start
+    while first <= last
+      let lines = a:Get(first, min([first + chunk_size - 1, last]))
+      if empty(lines) || !s:scanner_feed(scanner, lines)
+        break
+      endif
+      let first += len(lines)
+    endwhile
+    2DebugYaifa printf('Sample: lines %s to %s, %s hints', start,
+          \ scanner.linenr, scanner.hint_count)
+    let merged.tab += scanner.tab
+    call yaifa#histogram#add(merged.space, scanner.space)
+    call yaifa#histogram#add(merged.mixed, scanner.mixed)
+    call yaifa#histogram#add(merged.either, scanner.either)
+    let merged.processed_count += scanner.processed_count
+    let merged.ignored_count += scanner.ignored_count
+    let merged.hint_count += scanner.hint_count
+    for [phase, time] in items(scanner.stats)
+      let merged.stats[phase] += time
+    endfor
+  endfor
+  let merged.start_time = start_time
+  let merged.stage = 'sampled'
+  let result = s:scanner_result(merged)
+  let result.windows = len(starts)
+  return result
+endfunction "}}}
+
+" Like yaifa#analyze_lines(), but only a few windows spread over the lines
+" are scanned, see s:analyze_sampled().
+function! yaifa#analyze_lines_sampled(lines, filetype, defaults) "{{{
+  return s:analyze_sampled(function('s:slice', [a:lines]), len(a:lines),
+        \ a:filetype, a:defaults, 0)
+endfunction "}}}
+
+" Like yaifa#analyze_buffer(), but only a few windows spread over the buffer
+" are scanned, see s:analyze_sampled().
+function! yaifa#analyze_buffer_sampled(bufnr, filetype, defaults) "{{{
+  let total = get(get(getbufinfo(a:bufnr), 0, {}), 'linecount', 0)
+  return s:analyze_sampled(function('getbufline', [a:bufnr]), total,
+        \ a:filetype, a:defaults, a:bufnr == bufnr('%'))
+endfunction "}}}
+
+function! s:option(bufnr, name, default) "{{{
+  return getbufvar(a:bufnr, a:name, get(g:, a:name, a:default))
+endfunction "}}}
+
+function! yaifa#defaults(bufnr) "{{{
+  let default_shiftwidth = s:option(a:bufnr, 'yaifa_shiftwidth', 4)
+  let default_tabstop = s:option(a:bufnr, 'yaifa_tabstop', 8)
+  let default_expandtab = s:option(a:bufnr, 'yaifa_expandtab', 1)
   if default_expandtab
     let default_type = 'space'
   elseif !default_shiftwidth || default_shiftwidth == default_tabstop
@@ -256,52 +763,471 @@ function! yaifa#magic(bufnr) "{{{
     let default_type = 'mixed'
   endif
   let defaults = {}
-  let defaults.max_lines = 1024
+  let defaults.max_lines = s:option(a:bufnr, 'yaifa_max_lines', 1024)
+  let defaults.quick_lines = s:option(a:bufnr, 'yaifa_quick_lines', 128)
+  let defaults.confidence = s:option(a:bufnr, 'yaifa_confidence', 0.6)
+  let defaults.escalate = s:option(a:bufnr, 'yaifa_escalate', 'deep')
+  let defaults.chunk_size = s:option(a:bufnr, 'yaifa_chunk_size', 256)
+  let defaults.margin = s:option(a:bufnr, 'yaifa_margin', 24)
+  let defaults.synid = s:option(a:bufnr, 'yaifa_synid', 0)
+  let defaults.synid_budget = s:option(a:bufnr, 'yaifa_synid_budget', 20)
+  let defaults.sample = s:option(a:bufnr, 'yaifa_sample', 0)
+  let defaults.windows = s:option(a:bufnr, 'yaifa_sample_windows', 5)
+  let defaults.window_lines = s:option(a:bufnr, 'yaifa_sample_lines', 200)
+  let defaults.large_file =
+        \ s:option(a:bufnr, 'yaifa_large_file', [8388608, 100000])
+  let defaults.huge_file =
+        \ s:option(a:bufnr, 'yaifa_huge_file', [268435456, 4000000])
   let defaults.type = default_type
   let defaults.indent = default_shiftwidth
   let defaults.tabstop = default_tabstop
-  " Do the guess work
-  let result = yaifa#analyze_lines(lines, &filetype, defaults)
-  if result.type ==# 'tab'
+  let defaults.syntax =
+        \ yaifa#syntax#get(getbufvar(a:bufnr, '&filetype'), a:bufnr)
+  return defaults
+endfunction "}}}
+
+" Set the options, unless something else did it first or [force] is given.
+function! yaifa#apply(bufnr, result, defaults, ...) "{{{
+  if a:result.type ==# 'tab'
     " Use tabs
     let expandtab = 0
     let shiftwidth = 0
     let softtabstop = 0
-    let tabstop = default_tabstop
-  elseif result.type ==# 'mixed'
+    let tabstop = get(a:result, 'tabstop', a:defaults.tabstop)
+  elseif a:result.type ==# 'mixed'
     " Use tabs and spaces
     let expandtab = 0
-    let shiftwidth = result.indent
-    let softtabstop = result.indent
-    let tabstop = 8
+    let shiftwidth = a:result.indent
+    let softtabstop = a:result.indent
+    let tabstop = get(a:result, 'tabstop', 8)
   else
     " Use spaces only
     let expandtab = 1
-    let shiftwidth = result.indent
-    let softtabstop = result.indent
-    let tabstop = 8
+    let shiftwidth = a:result.indent
+    let softtabstop = a:result.indent
+    let tabstop = get(a:result, 'tabstop', 8)
   endif
   let template = 'setlocal %s tabstop=%s shiftwidth=%s softtabstop=%s'
   let set_cmd = printf(template, expandtab, tabstop, shiftwidth, softtabstop)
-  if !exists('b:indent_options_set')
-    for option in ['expandtab', 'shiftwidth', 'softtabstop', 'tabstop']
+  if (a:0 && a:1) || empty(getbufvar(a:bufnr, 'indent_options_set'))
+    for option in s:options
       call setbufvar(a:bufnr, printf('&%s', option), get(l:, option))
     endfor
-    let b:indent_options_set = 1
-    if !exists('b:undo_ftplugin') || b:undo_ftplugin =~# '\m^[ \t:]*$'
-      let b:undo_ftplugin = 'unlet! b:indent_options_set'
-    else
-      let b:undo_ftplugin .= ' | unlet! b:indent_options_set'
+    " Remember what was set, to tell if the user changed it later.
+    call setbufvar(a:bufnr, 'yaifa_applied',
+          \ {'type': a:result.type, 'indent': a:result.indent,
+          \  'source': get(a:result, 'source', 'analysis'),
+          \  'options': yaifa#option_values(a:bufnr)})
+    call setbufvar(a:bufnr, 'indent_options_set', 1)
+    let undo_ftplugin = getbufvar(a:bufnr, 'undo_ftplugin')
+    if undo_ftplugin =~# '\m^[ \t:]*$'
+      let undo_ftplugin = 'unlet! b:indent_options_set'
+    elseif undo_ftplugin !~# '\m\<unlet! b:indent_options_set\>'
+      let undo_ftplugin .= ' | unlet! b:indent_options_set'
     endif
+    call setbufvar(a:bufnr, 'undo_ftplugin', undo_ftplugin)
   endif
   1DebugYaifa set_cmd
   return set_cmd
 endfunction "}}}
 
-function! yaifa#test() "{{{
+" Returns the path of the file to use as key for the result cache, or an empty
+" string if the cache can not be used for the buffer.
+function! s:cache_key(bufnr) "{{{
+  if !yaifa#cache#enabled() || getbufvar(a:bufnr, '&modified')
+        \ || !empty(getbufvar(a:bufnr, '&buftype'))
+    return ''
+  endif
+  let path = fnamemodify(bufname(a:bufnr), ':p')
+  return filereadable(path) ? path : ''
+endfunction "}}}
+
+" What a cached result of the buffer must have been obtained with.
+function! s:cache_settings(bufnr, defaults) "{{{
+  return yaifa#cache#settings(getbufvar(a:bufnr, '&filetype'), a:defaults)
+endfunction "}}}
+
+" Use what was learned from other files of the same project when the buffer
+" itself did not give enough hints.
+function! s:project_result(bufnr, result, defaults) "{{{
+  if !get(g:, 'yaifa_project', 0) || !has_key(a:result, 'evidence')
+        \ || !empty(getbufvar(a:bufnr, '&buftype'))
+    return a:result
+  endif
+  let path = fnamemodify(bufname(a:bufnr), ':p')
+  let filetype = getbufvar(a:bufnr, '&filetype')
+  let evidence = a:result.evidence
+  if evidence.count >= s:option(a:bufnr, 'yaifa_project_min_hints', 10)
+    call yaifa#project#learn(path, filetype, evidence)
+    return a:result
+  endif
+  let prior = yaifa#project#prior(path, filetype)
+  if empty(prior)
+    return a:result
+  endif
+  let hints = yaifa#project#merge(prior, evidence)
+  let result = extend(yaifa#verdict(hints, a:defaults),
+        \ {'lines': get(a:result, 'lines', 0), 'evidence': evidence})
+  1DebugYaifa printf('Project: %s hints from %s turned %s into %s',
+        \ prior.count, yaifa#project#root(path),
+        \ a:result.type . a:result.indent, result.type . result.indent)
+  return result
+endfunction "}}}
+
+function! s:timed_apply(bufnr, result, defaults) "{{{
+  let apply_time = reltime()
+  let set_cmd = yaifa#apply(a:bufnr, a:result, a:defaults)
+  let apply = {'apply': reltimefloat(reltime(apply_time))}
+  if has_key(a:result, 'stats')
+    call extend(a:result.stats, apply)
+  endif
+  call yaifa#stats_add(apply)
+  return set_cmd
+endfunction "}}}
+
+" Whether the size is over the limits, [bytes, lines] where 0 means no limit.
+function! s:over(size, limits) "{{{
+  return (a:limits[0] > 0 && a:size[0] > a:limits[0])
+        \ || (a:limits[1] > 0 && a:size[1] > a:limits[1])
+endfunction "}}}
+
+" How the size of the buffer says it should be analyzed: "full", "sampled"
+" or "skip", see 'yaifa_large_file' and 'yaifa_huge_file'.
+function! s:tier(bufnr, defaults) "{{{
+  let bytes = getfsize(fnamemodify(bufname(a:bufnr), ':p'))
+  let lines = get(get(getbufinfo(a:bufnr), 0, {}), 'linecount', 0)
+  " getfsize() gives -2 when the size does not fit in a Number.
+  if bytes == -2 || s:over([bytes, lines], a:defaults.huge_file)
+    let tier = 'skip'
+  elseif s:over([bytes, lines], a:defaults.large_file)
+    let tier = 'sampled'
+  else
+    let tier = 'full'
+  endif
+  1DebugYaifa printf('Size: buffer %s has %s bytes and %s lines, %s',
+        \ a:bufnr, bytes, lines, tier)
+  return tier
+endfunction "}}}
+
+" Sample the buffer if it is too big for a full analysis, or if asked to and
+" it is big enough for it to pay off.
+function! s:wants_sample(bufnr, defaults, tier) "{{{
+  return a:tier ==# 'sampled' || (a:defaults.sample
+        \ && get(get(getbufinfo(a:bufnr), 0, {}), 'linecount', 0)
+        \   > a:defaults.windows * a:defaults.window_lines)
+endfunction "}}}
+
+" What to do with a buffer too big to be analyzed: go with what was learned
+" from the rest of the project, if anything. Returns an empty dict
+" otherwise, the options are left alone then.
+function! s:project_default(bufnr, defaults) "{{{
+  let path = fnamemodify(bufname(a:bufnr), ':p')
+  let prior = !get(g:, 'yaifa_project', 0) ? {}
+        \ : yaifa#project#prior(path, getbufvar(a:bufnr, '&filetype'))
+  if empty(prior)
+    1DebugYaifa printf('Size: not analyzing buffer %s, too big', a:bufnr)
+    return {}
+  endif
+  let result = extend(yaifa#verdict(prior, a:defaults),
+        \ {'lines': 0, 'source': 'project'})
+  1DebugYaifa printf('Size: buffer %s too big, using %s from %s', a:bufnr,
+        \ result.type . result.indent, yaifa#project#root(path))
+  return result
+endfunction "}}}
+
+" The defaults for the first pass over the buffer. The scanner goes from the
+" quick pass to the deep one by itself, but with 'yaifa_escalate' set to
+" "sampled" buffers too big for the deep pass to see whole only get the quick
+" pass, see s:second_pass().
+function! s:first_pass(bufnr, defaults) "{{{
+  if a:defaults.escalate !=# 'sampled' || a:defaults.quick_lines <= 0
+        \ || a:defaults.max_lines <= 0
+        \ || get(get(getbufinfo(a:bufnr), 0, {}), 'linecount', 0)
+        \   <= a:defaults.max_lines
+    return a:defaults
+  endif
+  return extend(copy(a:defaults), {'max_lines': a:defaults.quick_lines,
+        \ 'quick_lines': 0, 'then_sample': 1})
+endfunction "}}}
+
+" Sample the buffer if the quick pass given by s:first_pass() was not clear
+" enough.
+function! s:second_pass(bufnr, result, defaults) "{{{
+  if !get(a:defaults, 'then_sample', 0)
+    return a:result
+  endif
+  if a:result.evidence.confidence >= a:defaults.confidence
+    let a:result.stage = 'quick'
+    return a:result
+  endif
+  2DebugYaifa printf('Quick pass not clear enough (%.2f), sampling',
+        \ a:result.evidence.confidence)
+  return yaifa#analyze_buffer_sampled(a:bufnr,
+        \ getbufvar(a:bufnr, '&filetype'), a:defaults)
+endfunction "}}}
+
+function! s:analyze(bufnr, defaults, tier) "{{{
+  let filetype = getbufvar(a:bufnr, '&filetype')
+  if s:wants_sample(a:bufnr, a:defaults, a:tier)
+    return yaifa#analyze_buffer_sampled(a:bufnr, filetype, a:defaults)
+  endif
+  let defaults = s:first_pass(a:bufnr, a:defaults)
+  return s:second_pass(a:bufnr,
+        \ yaifa#analyze_buffer(a:bufnr, filetype, defaults), defaults)
+endfunction "}}}
+
+let s:modeline_pattern = '\m\%(^\|\s\)\%(vi:\|vim\%([<=>]\=\d\+\)\=:\|ex:\)'
+      \ . '.*\<\%(no\)\=\%(et\|expandtab\|sw\|shiftwidth\|ts\|tabstop'
+      \ . '\|sts\|softtabstop\)\>'
+
+" Whether a modeline of the buffer sets any of the options.
+function! s:has_modeline(bufnr) "{{{
+  if !getbufvar(a:bufnr, '&modeline') || &modelines <= 0
+    return 0
+  endif
+  let line_count = get(get(getbufinfo(a:bufnr), 0, {}), 'linecount', 0)
+  let lines = getbufline(a:bufnr, 1, &modelines)
+  if line_count > &modelines
+    let lines += getbufline(a:bufnr,
+          \ max([&modelines + 1, line_count - &modelines + 1]), '$')
+  endif
+  return match(lines, s:modeline_pattern) >= 0
+endfunction "}}}
+
+" Look for something that already tells the indentation of the buffer, so
+" there is no need to guess. Returns an empty dict if nothing does, a dict
+" with the reason in the "skip" key if the options are set already or a
+" modeline will set them, or a result otherwise.
+function! s:resolve(bufnr) "{{{
+  if !empty(getbufvar(a:bufnr, 'indent_options_set'))
+    return {'skip': 'options already set'}
+  elseif s:option(a:bufnr, 'yaifa_modelines', 1) && s:has_modeline(a:bufnr)
+    return {'skip': 'modeline'}
+  elseif s:option(a:bufnr, 'yaifa_editorconfig', 1)
+        \ && empty(getbufvar(a:bufnr, '&buftype'))
+        \ && !empty(bufname(a:bufnr))
+    return yaifa#editorconfig#result(fnamemodify(bufname(a:bufnr), ':p'))
+  endif
+  return {}
+endfunction "}}}
+
+" Returns 1 if there was no need to analyze the buffer, after setting the
+" options if needed.
+function! s:resolved(bufnr, defaults) "{{{
+  let result = s:resolve(a:bufnr)
+  if empty(result)
+    return 0
+  elseif has_key(result, 'skip')
+    1DebugYaifa printf('Not analyzing buffer %s: %s', a:bufnr, result.skip)
+  else
+    1DebugYaifa printf('Buffer %s set by %s', a:bufnr, result.source)
+    call s:timed_apply(a:bufnr, result, a:defaults)
+  endif
+  return 1
+endfunction "}}}
+
+function! yaifa#magic(bufnr) "{{{
+  let defaults = yaifa#defaults(a:bufnr)
+  if s:resolved(a:bufnr, defaults)
+    return ''
+  endif
+  let cache_key = s:cache_key(a:bufnr)
+  let result = empty(cache_key) ? {}
+        \ : yaifa#cache#get(cache_key, s:cache_settings(a:bufnr, defaults))
+  let tier = empty(result) ? s:tier(a:bufnr, defaults) : 'cached'
+  if tier ==# 'skip'
+    let result = s:project_default(a:bufnr, defaults)
+    return empty(result) ? '' : s:timed_apply(a:bufnr, result, defaults)
+  elseif empty(result)
+    " Do the guess work
+    let result = s:analyze(a:bufnr, defaults, tier)
+    if !empty(cache_key)
+      call yaifa#cache#put(cache_key, s:cache_settings(a:bufnr, defaults),
+            \ result)
+    endif
+  endif
+  let result = s:project_result(a:bufnr, result, defaults)
+  return s:timed_apply(a:bufnr, result, defaults)
+endfunction "}}}
+
+function! yaifa#option_values(bufnr) "{{{
+  return map(copy(s:options), 'getbufvar(a:bufnr, "&" . v:val)')
+endfunction "}}}
+
+function! s:async_tick(task, timer) "{{{
+  let bufnr = a:task.bufnr
+  if !bufloaded(bufnr)
+    " The buffer is gone, there is nothing to set the options on.
+    call yaifa#cancel(bufnr)
+    return
+  endif
+  let size = a:task.tick_lines
+  let lines = getbufline(bufnr, a:task.first, a:task.first + size - 1)
+  let a:task.scanner.native = bufnr == bufnr('%')
+  if !empty(lines) && s:scanner_feed(a:task.scanner, lines)
+        \ && len(lines) == size
+    let a:task.first += size
+    return
+  endif
+  call yaifa#cancel(bufnr)
+  call s:finish(a:task, s:second_pass(bufnr, s:scanner_result(a:task.scanner),
+        \ a:task.scanner.defaults))
+endfunction "}}}
+
+" Set the options from the result of an analysis done in the background.
+function! s:finish(task, result) "{{{
+  let bufnr = a:task.bufnr
+  if !empty(a:task.cache_key)
+    call yaifa#cache#put(a:task.cache_key,
+          \ s:cache_settings(bufnr, a:task.defaults), a:result)
+  endif
+  if yaifa#option_values(bufnr) != a:task.options
+    " Something else, e.g.: a modeline or the user, changed the options
+    " while we were busy. Those take precedence.
+    1DebugYaifa printf('Options of buffer %s changed, not setting them.',
+          \ bufnr)
+    return
+  endif
+  let result = s:project_result(bufnr, a:result, a:task.defaults)
+  call s:timed_apply(bufnr, result, a:task.defaults)
+endfunction "}}}
+
+" Analyze the buffer a few lines at a time from a timer, so this returns
+" right away. The options are set when the scan is complete.
+function! yaifa#magic_async(bufnr) "{{{
+  call yaifa#cancel(a:bufnr)
+  let defaults = yaifa#defaults(a:bufnr)
+  if s:resolved(a:bufnr, defaults)
+    return
+  endif
+  let cache_key = s:cache_key(a:bufnr)
+  let result = empty(cache_key) ? {}
+        \ : yaifa#cache#get(cache_key, s:cache_settings(a:bufnr, defaults))
+  let tier = empty(result) ? s:tier(a:bufnr, defaults) : 'cached'
+  if tier ==# 'skip'
+    let result = s:project_default(a:bufnr, defaults)
+    if !empty(result)
+      call s:timed_apply(a:bufnr, result, defaults)
+    endif
+    return
+  elseif empty(result) && s:wants_sample(a:bufnr, defaults, tier)
+    " The cost is fixed and small, no need to go in the background.
+    let result = s:analyze(a:bufnr, defaults, tier)
+    if !empty(cache_key)
+      call yaifa#cache#put(cache_key, s:cache_settings(a:bufnr, defaults),
+            \ result)
+    endif
+  endif
+  if !empty(result)
+    " Nothing to wait for.
+    let result = s:project_result(a:bufnr, result, defaults)
+    call s:timed_apply(a:bufnr, result, defaults)
+    return
+  endif
+  let task = {}
+  let task.bufnr = a:bufnr
+  let task.cache_key = cache_key
+  let task.first = 1
+  let task.tick_lines = s:option(a:bufnr, 'yaifa_async_lines', 256)
+  let task.options = yaifa#option_values(a:bufnr)
+  let task.defaults = defaults
+  let task.scanner = s:scanner_new(getbufvar(a:bufnr, '&filetype'),
+        \ s:first_pass(a:bufnr, defaults))
+  let task.timer = timer_start(0, function('s:async_tick', [task]),
+        \ {'repeat': -1})
+  let task.cancel = function('timer_stop', [task.timer])
+  let s:tasks[a:bufnr] = task
+endfunction "}}}
+
+function! s:job_done(task) "{{{
+  if get(s:tasks, a:task.bufnr, {}) isnot a:task
+    " Cancelled.
+    return
+  endif
+  call remove(s:tasks, a:task.bufnr)
+  if bufloaded(a:task.bufnr)
+    call s:finish(a:task, a:task.analyzer.finish())
+  endif
+endfunction "}}}
+
+" Analyze the first bytes of the file as a job reads them, for files that
+" are slow to read, e.g.: remote ones. The options are set when the job is
+" done. Returns 0 if no job could be started.
+function! yaifa#magic_job(bufnr) "{{{
+  let command = yaifa#job#command(bufname(a:bufnr),
+        \ s:option(a:bufnr, 'yaifa_job_bytes', 65536))
+  if empty(command)
+    return 0
+  endif
+  call yaifa#cancel(a:bufnr)
+  let defaults = yaifa#defaults(a:bufnr)
+  if s:resolved(a:bufnr, defaults)
+    return 1
+  endif
+  let task = {}
+  let task.bufnr = a:bufnr
+  let task.cache_key = s:cache_key(a:bufnr)
+  let result = empty(task.cache_key) ? {} : yaifa#cache#get(task.cache_key,
+        \ s:cache_settings(a:bufnr, defaults))
+  if !empty(result)
+    let result = s:project_result(a:bufnr, result, defaults)
+    call s:timed_apply(a:bufnr, result, defaults)
+    return 1
+  endif
+  let task.options = yaifa#option_values(a:bufnr)
+  let task.defaults = defaults
+  let task.analyzer =
+        \ yaifa#analyzer_new(getbufvar(a:bufnr, '&filetype'), defaults)
+  let job = yaifa#job#start(command, task.analyzer,
+        \ function('s:job_done', [task]))
+  if empty(job)
+    return 0
+  endif
+  2DebugYaifa printf('Job: %s', string(command))
+  let task.cancel = function('yaifa#job#stop', [job])
+  let s:tasks[a:bufnr] = task
+  return 1
+endfunction "}}}
+
+" Stop the background analysis or job of the given buffer, if there is one.
+function! yaifa#cancel(bufnr) "{{{
+  if has_key(s:tasks, a:bufnr)
+    call call(remove(s:tasks, a:bufnr).cancel, [])
+  endif
+endfunction "}}}
+
+" Analyze the file and check the result against the expected type and
+" indent. result.error is 1 if the type is wrong, 2 if only the indent is.
+function! yaifa#test_file(file, type, value) "{{{
+  let lines = readfile(a:file)
+  let test_time = reltime()
+  " Do some guessing, in two stages like when a buffer is opened.
+  let defaults = yaifa#defaults(-1)
+  let result = yaifa#analyze_lines(lines, '', {'max_lines': 1024 * 2,
+        \ 'quick_lines': defaults.quick_lines,
+        \ 'confidence': defaults.confidence})
+  let test_time = reltimefloat(reltime(test_time)) * 100
+  let result.time = floor(test_time) / 100.0
+  let result.path = a:file
+  let result.exp_type = a:type
+  let result.exp_value = a:value
+  if result.type !=? a:type
+    let result.error = 1
+  elseif result.indent != a:value
+    let result.error = 2
+  else
+    let result.error = 0
+  endif
+  return result
+endfunction "}}}
+
+" Analyze every file in the test directory and report the results. With
+" [workers] greater than 1, the files are split among that many Vim
+" processes, see yaifa#test#parallel().
+function! yaifa#test(...) "{{{
   let start_time = reltime()
   let results = {}
-  let results.files = []
+  let tests = []
   let testdirspat = s:script_dir . '/test/*'
   let testdirs = glob(testdirspat, 0, 1)
   call map(testdirs, 'fnamemodify(v:val, '':p:h'')')
@@ -312,39 +1238,34 @@ function! yaifa#test() "{{{
     " Directories with test files should be named <type>-<value>
     let [type, value] = split(fnamemodify(dir, ':t'), '-')
     for file in files
-      let lines = readfile(file)
-      let test_time = reltime()
-      " Do some guessing
-      let result = yaifa#analyze_lines(lines, '', {'max_lines': 1024 * 2})
-      let test_time = reltimefloat(reltime(test_time)) * 100
-      let test_time = floor(test_time) / 100.0
-      let test_path = printf('%s/%s', fnamemodify(dir, ':p:h:t'),
-            \ fnamemodify(file, ':p:t'))
-      let result.path = file
-      let result.error = 0
-      let result.exp_type = type
-      let result.exp_value = value
-      if result.type ==? type
-        if result.indent != value
-          let result.error = 2
-          echohl WarningMsg
-          echom printf('%ss:%s failed: wrong value, expected %s but got %s',
-                \ test_time, test_path, result.exp_value, result.indent)
-          echohl Normal
-        else
-          echom printf('%ss:%s passed: type %s and value %s',
-                \ test_time, test_path, result.type, result.indent)
-        endif
-      else
-        echohl WarningMsg
-          echom printf('%ss:%s failed: wrong type, expected %s but got %s',
-              \ test_time, test_path, result.exp_type, result.type)
-        echohl Normal
-        let result.error = 1
-      endif
-      call add(results.files, result)
+      call add(tests, [file, type, value])
     endfor
   endfor
+  let workers = get(a:000, 0, 1)
+  if workers > 1 && (has('job') || has('nvim'))
+    let results.files = yaifa#test#parallel(tests, workers)
+  else
+    let results.files =
+          \ map(tests, 'yaifa#test_file(v:val[0], v:val[1], v:val[2])')
+  endif
+  for result in results.files
+    let test_path = printf('%s/%s', fnamemodify(result.path, ':p:h:t'),
+          \ fnamemodify(result.path, ':p:t'))
+    if result.error == 2
+      echohl WarningMsg
+      echom printf('%ss:%s failed: wrong value, expected %s but got %s',
+            \ result.time, test_path, result.exp_value, result.indent)
+      echohl Normal
+    elseif result.error
+      echohl WarningMsg
+      echom printf('%ss:%s failed: wrong type, expected %s but got %s',
+            \ result.time, test_path, result.exp_type, result.type)
+      echohl Normal
+    else
+      echom printf('%ss:%s passed: type %s and value %s',
+            \ result.time, test_path, result.type, result.indent)
+    endif
+  endfor
   echom ' '
   echom printf('Elapsed time: %s seconds',
         \ reltimestr(reltime(start_time)))
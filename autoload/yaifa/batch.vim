@@ -0,0 +1,147 @@
+" Yaifa: Yet another indent finder, almost...
+" Version: 2.1
+" Author: Israel Chauca F. <israelchauca@gmail.com>
+
+if exists('g:loaded_yaifa_batch') && !get(g:, 'yaifa_debug', 0)
+  finish
+endif
+let g:loaded_yaifa_batch = 1
+
+" Filetype by file extension (or name, if it has none).
+let s:filetypes = {}
+" Hidden buffer the filetypes are detected on, see yaifa#batch#filetype().
+let s:scratch = get(s:, 'scratch', 0)
+
+function! s:files(patterns) "{{{
+  let files = []
+  for pattern in type(a:patterns) == type([]) ? a:patterns : [a:patterns]
+    for path in glob(pattern, 1, 1)
+      if isdirectory(path)
+        let files += filter(glob(path . '/**/*', 1, 1), '!isdirectory(v:val)')
+      elseif filereadable(path)
+        call add(files, path)
+      endif
+    endfor
+  endfor
+  return files
+endfunction "}}}
+
+function! s:detect(path) "{{{
+  execute 'silent doautocmd filetypedetect BufRead ' . fnameescape(a:path)
+  let filetype = &filetype
+  setlocal filetype=
+  return filetype
+endfunction "}}}
+
+" Returns the filetype Vim would give the file, going by its name. Safe to
+" use from a timer: the detection runs on a hidden buffer in a hidden window,
+" the user's windows and buffers are not touched, and FileType autocommands
+" do not run.
+function! yaifa#batch#filetype(path) "{{{
+  if !exists('#filetypedetect')
+    return ''
+  endif
+  let key = fnamemodify(a:path, ':e')
+  let key = empty(key) ? fnamemodify(a:path, ':t') : '.' . key
+  if has_key(s:filetypes, key)
+    return s:filetypes[key]
+  endif
+  if !has('nvim') && !has('popupwin')
+    return ''
+  endif
+  if !bufexists(s:scratch)
+    let s:scratch = bufadd('')
+    call setbufvar(s:scratch, '&buftype', 'nofile')
+    call setbufvar(s:scratch, '&bufhidden', 'hide')
+    call setbufvar(s:scratch, '&swapfile', 0)
+    call setbufvar(s:scratch, '&buflisted', 0)
+    call bufload(s:scratch)
+  endif
+  let eventignore = &eventignore
+  set eventignore+=FileType
+  try
+    if has('nvim')
+      let s:filetypes[key] =
+            \ nvim_buf_call(s:scratch, function('s:detect', [a:path]))
+    else
+      let winid = popup_create(s:scratch, {'hidden': 1})
+      try
+        call win_execute(winid,
+              \ 'let s:filetypes[key] = s:detect(a:path)')
+      finally
+        call popup_close(winid)
+      endtry
+    endif
+  finally
+    let &eventignore = eventignore
+  endtry
+  return get(s:filetypes, key, '')
+endfunction "}}}
+
+" Analyze a file reading only as many lines as the scanner could ask for.
+" result.read is the number of lines read, result.binary is 1 if they have
+" NUL bytes.
+function! yaifa#batch#analyze(path, filetype, defaults) "{{{
+  let analyzer = yaifa#analyzer_new(a:filetype, a:defaults)
+  let size = a:defaults.max_lines > 0 ? a:defaults.max_lines * 2 : -1
+  let read = 0
+  let binary = 0
+  while 1
+    let lines = readfile(a:path, '', size)
+    " readfile() turns NUL bytes into newlines.
+    let binary = binary || match(lines, '\n', read) >= 0
+    let wants_more = analyzer.feed(lines[read :])
+    let read = len(lines)
+    if size < 0 || read < size || !wants_more
+      " Either the whole file was read or the analyzer had enough.
+      break
+    endif
+    " Too many comments, read more lines and go on from where it stopped.
+    let size = size * 2
+  endwhile
+  let result = analyzer.finish()
+  let result.read = read
+  let result.binary = binary
+  return result
+endfunction "}}}
+
+" Analyze every file matching the given glob patterns (a string or a list,
+" directories are walked) and write one JSON object per file to
+" options.output, followed by a summary. Returns the summary.
+function! yaifa#batch#run(patterns, ...) "{{{
+  let options = {'output': '', 'repeat': 1, 'max_lines': 1024,
+        \ 'margin': 24, 'filetype': 1}
+  call extend(options, get(a:000, 0, {}), 'force')
+  let defaults = {'max_lines': options.max_lines, 'margin': options.margin}
+  let files = s:files(a:patterns)
+  let records = []
+  let summary = {'files': 0, 'lines': 0, 'read': 0}
+  let start_time = reltime()
+  for i in range(options.repeat)
+    for path in files
+      let filetype = options.filetype ? yaifa#batch#filetype(path) : ''
+      let file_time = reltime()
+      let result = yaifa#batch#analyze(path, filetype, defaults)
+      let elapsed = reltimefloat(reltime(file_time))
+      call add(records, json_encode({'path': path, 'filetype': filetype,
+            \ 'type': result.type, 'indent': result.indent,
+            \ 'evidence': result.evidence, 'lines': result.lines,
+            \ 'read': result.read, 'elapsed': elapsed}))
+      let summary.files += 1
+      let summary.lines += result.lines
+      let summary.read += result.read
+    endfor
+  endfor
+  let summary.elapsed = reltimefloat(reltime(start_time))
+  let summary.files_per_second = summary.elapsed > 0
+        \ ? summary.files / summary.elapsed : 0.0
+  let summary.lines_per_second = summary.elapsed > 0
+        \ ? summary.lines / summary.elapsed : 0.0
+  call add(records, json_encode({'summary': summary}))
+  if !empty(options.output)
+    call writefile(records, options.output)
+  endif
+  1DebugYaifa printf('Batch: %s files in %.2f seconds, %.0f lines/s',
+        \ summary.files, summary.elapsed, summary.lines_per_second)
+  return summary
+endfunction "}}}
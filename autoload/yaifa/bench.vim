@@ -0,0 +1,140 @@
+" Yaifa: Yet another indent finder, almost...
+" Version: 2.1
+" Author: Israel Chauca F. <israelchauca@gmail.com>
+
+if exists('g:loaded_yaifa_bench') && !get(g:, 'yaifa_debug', 0)
+  finish
+endif
+let g:loaded_yaifa_bench = 1
+
+let s:script_dir = expand('<sfile>:p:h:h:h')
+
+function! s:baseline_file() "{{{
+  return get(g:, 'yaifa_bench_baseline', s:script_dir . '/bench_baseline.json')
+endfunction "}}}
+
+" min, median and p95 of a list of times.
+function! s:summary(times) "{{{
+  if empty(a:times)
+    return {'min': 0.0, 'median': 0.0, 'p95': 0.0}
+  endif
+  let times = sort(copy(a:times), 'f')
+  let n = len(times)
+  return {'min': times[0], 'median': times[n / 2],
+        \ 'p95': times[float2nr(ceil(n * 0.95)) - 1]}
+endfunction "}}}
+
+function! s:compare(name, current, baseline, threshold, report) "{{{
+  if type(a:baseline) != type({}) || get(a:baseline, 'median', 0) <= 0
+    return
+  endif
+  let change = a:current.median / a:baseline.median - 1
+  if change > a:threshold
+    call add(a:report.regressions, printf('%s: %.4fs -> %.4fs (%+.0f%%)',
+          \ a:name, a:baseline.median, a:current.median, change * 100))
+  endif
+endfunction "}}}
+
+" Run yaifa#analyze_lines() on every file under test/ options.runs times,
+" and compare the medians with the stored baseline. The files are analyzed
+" with the settings buffers get, see yaifa#defaults().
+function! yaifa#bench#run(...) "{{{
+  let defaults = yaifa#defaults(-1)
+  let options = {'runs': 10, 'max_lines': defaults.max_lines,
+        \ 'quick_lines': defaults.quick_lines,
+        \ 'confidence': defaults.confidence, 'margin': defaults.margin,
+        \ 'threshold': 0.2, 'baseline': s:baseline_file(), 'save': 0,
+        \ 'output': ''}
+  call extend(options, get(a:000, 0, {}), 'force')
+  let options.runs = max([1, options.runs])
+  let report = {'files': {}, 'dirs': {}, 'regressions': []}
+  let total_times = repeat([0.0], options.runs)
+  let total_lines = 0
+  " How many files were decided by every stage, see s:escalate().
+  let stages = {}
+  let testdirs = filter(glob(s:script_dir . '/test/*', 0, 1),
+        \ 'isdirectory(v:val)')
+  for dir in testdirs
+    let dir_name = fnamemodify(dir, ':t')
+    let dir_times = repeat([0.0], options.runs)
+    for file in glob(dir . '/*', 0, 1)
+      let lines = readfile(file)
+      let times = []
+      for i in range(options.runs)
+        let start_time = reltime()
+        let result = yaifa#analyze_lines(lines, '',
+              \ {'max_lines': options.max_lines,
+              \  'quick_lines': options.quick_lines,
+              \  'confidence': options.confidence,
+              \  'margin': options.margin})
+        call add(times, reltimefloat(reltime(start_time)))
+        let dir_times[i] += times[-1]
+        let total_times[i] += times[-1]
+      endfor
+      let total_lines += result.lines
+      let stages[result.stage] = get(stages, result.stage, 0) + 1
+      let name = dir_name . '/' . fnamemodify(file, ':t')
+      let report.files[name] = extend(s:summary(times),
+            \ {'lines': result.lines, 'stage': result.stage})
+    endfor
+    let report.dirs[dir_name] = s:summary(dir_times)
+  endfor
+  let report.total = s:summary(total_times)
+  let report.total.lines = total_lines
+  let report.total.stages = stages
+  let report.total.lines_per_second = report.total.median > 0
+        \ ? total_lines / report.total.median : 0.0
+  " Compare with the baseline, only directories and the total are checked,
+  " single files are too noisy.
+  let baseline = {}
+  if filereadable(options.baseline)
+    let baseline = json_decode(join(readfile(options.baseline), ''))
+    if type(baseline) != type({})
+      let baseline = {}
+    endif
+    let dirs = get(baseline, 'dirs', {})
+    for [name, dir] in items(report.dirs)
+      call s:compare(name, dir,
+            \ type(dirs) == type({}) ? get(dirs, name, {}) : {},
+            \ options.threshold, report)
+    endfor
+    call s:compare('total', report.total, get(baseline, 'total', {}),
+          \ options.threshold, report)
+  endif
+  let report.passed = empty(report.regressions)
+  for [name, file] in sort(items(report.files))
+    echom printf('%s: min %.4fs median %.4fs p95 %.4fs', name, file.min,
+          \ file.median, file.p95)
+  endfor
+  for [name, dir] in sort(items(report.dirs))
+    echom printf('%s/: min %.4fs median %.4fs p95 %.4fs', name, dir.min,
+          \ dir.median, dir.p95)
+  endfor
+  echom printf('Total: min %.4fs median %.4fs p95 %.4fs, %.0f lines/s',
+        \ report.total.min, report.total.median, report.total.p95,
+        \ report.total.lines_per_second)
+  echom 'Files by stage: ' . join(map(sort(items(stages)),
+        \ 'v:val[0] . " " . v:val[1]'), ', ')
+  if empty(baseline)
+    echom printf('No baseline found in %s', options.baseline)
+  elseif report.passed
+    echom printf('No regressions over %.0f%% against %s',
+          \ options.threshold * 100, options.baseline)
+  else
+    echohl WarningMsg
+    echom 'Regressions:'
+    echohl Normal
+    for regression in report.regressions
+      echom regression
+    endfor
+  endif
+  if options.save
+    call writefile([json_encode(report)], options.baseline)
+    echom printf('Baseline saved to %s', options.baseline)
+  endif
+  if !empty(options.output)
+    call writefile([json_encode(report)], options.output)
+  endif
+  let g:yaifa_bench_result = report
+  return report
+endfunction "}}}
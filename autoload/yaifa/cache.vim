@@ -0,0 +1,237 @@
+" Yaifa: Yet another indent finder, almost...
+" Version: 2.1
+" Author: Israel Chauca F. <israelchauca@gmail.com>
+
+if exists('g:loaded_yaifa_cache') && !get(g:, 'yaifa_debug', 0)
+  finish
+endif
+let g:loaded_yaifa_cache = 1
+
+" The results are kept in memory as they are in the cache file, the file is
+" read again only when it was changed by somebody else.
+let s:data = {'tick': 0, 'entries': {}}
+let s:file_time = -1
+let s:dirty = 0
+" Paths of the entries changed since the last save, only those are written
+" over what other Vim instances saved meanwhile.
+let s:changed = {}
+" Timer of the next save, see s:schedule().
+let s:timer = get(s:, 'timer', 0)
+let s:save_delay = 2000
+" Whether to keep results in memory when there is no cache directory, see
+" yaifa#cache#use_memory().
+let s:memory = get(s:, 'memory', 0)
+
+function! s:file() "{{{
+  return simplify(fnamemodify(expand(get(g:, 'yaifa_cache_dir', '')), ':p')
+        \ . '/results.json')
+endfunction "}}}
+
+" Whether the results are stored in a file.
+function! s:persistent() "{{{
+  return !empty(get(g:, 'yaifa_cache_dir', '')) && exists('*json_encode')
+endfunction "}}}
+
+" The data in the cache file, empty if there is none or it is not valid.
+function! s:read(file) "{{{
+  let data = {'tick': 0, 'entries': {}}
+  if getftime(a:file) < 0
+    return data
+  endif
+  try
+    let stored = json_decode(join(readfile(a:file), ''))
+  catch
+    1DebugYaifa printf('Could not read the cache file %s: %s', a:file,
+          \ v:exception)
+    return data
+  endtry
+  if type(stored) == type({}) && type(get(stored, 'entries')) == type({})
+    call extend(data, stored)
+  endif
+  return data
+endfunction "}}}
+
+function! s:load() "{{{
+  if !s:persistent()
+    return
+  endif
+  let file = s:file()
+  let file_time = getftime(file)
+  if file_time == s:file_time
+    return
+  endif
+  let s:file_time = file_time
+  let data = s:read(file)
+  " Keep what was not saved yet.
+  for path in keys(s:changed)
+    if has_key(s:data.entries, path)
+      let data.entries[path] = s:data.entries[path]
+    endif
+  endfor
+  let data.tick = max([data.tick, s:data.tick])
+  let s:data = data
+endfunction "}}}
+
+" Drop the least recently used entries once there are too many, down to 90%
+" of the limit so it does not happen again on the next few results. At least
+" one is kept.
+function! s:evict() "{{{
+  let max_entries = get(g:, 'yaifa_cache_size', 1000)
+  if len(s:data.entries) <= max_entries
+    return
+  endif
+  let uses = sort(map(values(s:data.entries), 'v:val.used'), 'n')
+  let last_use = uses[len(uses) - max([1, max_entries * 9 / 10]) - 1]
+  call filter(s:data.entries, 'v:val.used > last_use')
+  call filter(s:changed, 'has_key(s:data.entries, v:key)')
+  1DebugYaifa printf('Cache: dropped %s entries',
+        \ len(uses) - len(s:data.entries))
+endfunction "}}}
+
+" Write the entries changed here over the ones in the cache file, other Vim
+" instances could have saved theirs since it was read. The file is replaced
+" in one go, so nobody reads half of it. With [merge] 0 the file is
+" overwritten with what is in memory.
+function! s:save(...) "{{{
+  if !s:persistent()
+    call s:evict()
+    let s:dirty = 0
+    let s:changed = {}
+    return
+  endif
+  let file = s:file()
+  let dir = fnamemodify(file, ':h')
+  if !isdirectory(dir)
+    call mkdir(dir, 'p')
+  endif
+  if get(a:000, 0, 1)
+    " Read it again even if the time did not change, it is in seconds.
+    let s:file_time = -2
+    call s:load()
+  endif
+  call s:evict()
+  let temp = printf('%s.%s.tmp', file, getpid())
+  if writefile([json_encode(s:data)], temp) == 0 && rename(temp, file) == 0
+    let s:file_time = getftime(file)
+    let s:dirty = 0
+    let s:changed = {}
+  else
+    call delete(temp)
+  endif
+endfunction "}}}
+
+" Save a little later, so results that come together are written at once.
+function! s:schedule() "{{{
+  let s:dirty = 1
+  if !has('timers')
+    call s:save()
+  elseif !s:timer
+    let s:timer = timer_start(s:save_delay, function('s:on_timer'))
+  endif
+endfunction "}}}
+
+function! s:on_timer(timer) "{{{
+  let s:timer = 0
+  call yaifa#cache#flush()
+endfunction "}}}
+
+function! yaifa#cache#enabled() "{{{
+  return s:memory || s:persistent()
+endfunction "}}}
+
+" Keep the results in memory for the rest of the session even if there is no
+" cache directory.
+function! yaifa#cache#use_memory() "{{{
+  let s:memory = 1
+endfunction "}}}
+
+" What the result depends on besides the file: the filetype and the
+" settings of the analysis, see yaifa#defaults(). The comment and block
+" patterns (see yaifa#syntax#get()) go in as a hash, they are long.
+function! yaifa#cache#settings(filetype, defaults) "{{{
+  let syntax = string(get(a:defaults, 'syntax',
+        \ yaifa#syntax#get(a:filetype)))
+  return string([a:filetype] + map(['max_lines', 'quick_lines',
+        \ 'confidence', 'escalate', 'margin', 'sample', 'windows',
+        \ 'window_lines', 'large_file', 'synid', 'type', 'indent',
+        \ 'tabstop'], 'get(a:defaults, v:val, "")')
+        \ + [exists('*sha256') ? sha256(syntax) : syntax])
+endfunction "}}}
+
+" Returns the cached result for the given file, or an empty dict if there is
+" none, or the file or the settings (see yaifa#cache#settings()) changed
+" since it was stored.
+function! yaifa#cache#get(path, settings) "{{{
+  let path = fnamemodify(a:path, ':p')
+  call s:load()
+  let entry = get(s:data.entries, path, {})
+  if empty(entry)
+    return {}
+  endif
+  if entry.mtime != getftime(path) || entry.size != getfsize(path)
+    1DebugYaifa printf('Cache: stale entry for %s', path)
+    return {}
+  elseif get(entry, 'settings', '') !=# a:settings
+    1DebugYaifa printf('Cache: entry for %s with other settings', path)
+    return {}
+  endif
+  let s:data.tick += 1
+  let entry.used = s:data.tick
+  " Saving the new use time can wait, see yaifa#cache#flush().
+  let s:dirty = 1
+  let s:changed[path] = 1
+  1DebugYaifa printf('Cache: hit for %s', path)
+  let result = {'type': entry.type, 'indent': entry.indent}
+  let evidence = get(entry, 'evidence', {})
+  if !empty(evidence)
+    let result.evidence = extend(copy(evidence),
+          \ {'space': yaifa#histogram#load(evidence.space),
+          \  'mixed': yaifa#histogram#load(evidence.mixed)})
+  endif
+  return result
+endfunction "}}}
+
+" Store the result for the given file, obtained with the given settings (see
+" yaifa#cache#settings()). The cache file is written a moment later, with
+" the other results stored by then, unless [save] is 0: then it waits for
+" yaifa#cache#flush().
+function! yaifa#cache#put(path, settings, result, ...) "{{{
+  let path = fnamemodify(a:path, ':p')
+  let mtime = getftime(path)
+  if mtime < 0
+    " Not a file on disk.
+    return
+  endif
+  call s:load()
+  let s:data.tick += 1
+  let s:data.entries[path] = {'mtime': mtime, 'size': getfsize(path),
+        \ 'settings': a:settings, 'type': a:result.type,
+        \ 'indent': a:result.indent, 'used': s:data.tick}
+  if has_key(a:result, 'evidence')
+    let s:data.entries[path].evidence = a:result.evidence
+  endif
+  let s:changed[path] = 1
+  if get(a:000, 0, 1)
+    call s:schedule()
+  else
+    let s:dirty = 1
+  endif
+endfunction "}}}
+
+" Save the results not saved yet, and drop the least recently used ones if
+" there are too many.
+function! yaifa#cache#flush() "{{{
+  if s:timer
+    call timer_stop(s:timer)
+    let s:timer = 0
+  endif
+  if s:dirty
+    call s:save()
+  endif
+endfunction "}}}
+
+function! yaifa#cache#clear() "{{{
+  let s:data = {'tick': 0, 'entries': {}}
+  let s:changed = {}
+  call s:save(0)
+endfunction "}}}
@@ -0,0 +1,170 @@
+" Yaifa: Yet another indent finder, almost...
+" Version: 2.1
+" Author: Israel Chauca F. <israelchauca@gmail.com>
+
+if exists('g:loaded_yaifa_editorconfig') && !get(g:, 'yaifa_debug', 0)
+  finish
+endif
+let g:loaded_yaifa_editorconfig = 1
+
+" Parsed .editorconfig files by directory, every one of them looks like:
+" {'mtime': -1 if there is none, 'root': 0 or 1,
+"  'sections': [[pattern, {property: value}], ...]}
+let s:configs = get(s:, 'configs', {})
+
+" Turn an EditorConfig glob into a pattern. Number ranges ({1..3}) match any
+" number.
+function! s:glob2pattern(glob) "{{{
+  let pattern = ''
+  let depth = 0
+  let index = 0
+  let length = strlen(a:glob)
+  while index < length
+    let char = a:glob[index]
+    let index += 1
+    if char ==# '*'
+      if a:glob[index] ==# '*'
+        let pattern .= '.*'
+        let index += 1
+      else
+        let pattern .= '[^/]*'
+      endif
+    elseif char ==# '?'
+      let pattern .= '[^/]'
+    elseif char ==# '['
+      let end = stridx(a:glob, ']', index)
+      if end < 0
+        let pattern .= '\['
+      else
+        let class = a:glob[index : end - 1]
+        let pattern .= '[' . substitute(class, '\m^!', '^', '') . ']'
+        let index = end + 1
+      endif
+    elseif char ==# '{'
+      let end = stridx(a:glob, '}', index)
+      if end > 0 && a:glob[index : end - 1] =~# '\m^-\=\d\+\.\.-\=\d\+$'
+        let pattern .= '-\=\d\+'
+        let index = end + 1
+      else
+        let pattern .= '\%('
+        let depth += 1
+      endif
+    elseif char ==# '}' && depth > 0
+      let pattern .= '\)'
+      let depth -= 1
+    elseif char ==# ',' && depth > 0
+      let pattern .= '\|'
+    elseif char ==# '\' && index < length
+      let pattern .= escape(a:glob[index], '\.*[]~^$')
+      let index += 1
+    else
+      let pattern .= escape(char, '\.*[]~^$')
+    endif
+  endwhile
+  return pattern . repeat('\)', depth)
+endfunction "}}}
+
+function! s:parse(dir, path) "{{{
+  let config = {'mtime': getftime(a:path), 'root': 0, 'sections': []}
+  let properties = {}
+  for line in readfile(a:path)
+    let line = substitute(line, '\m^\s*\|\s*$', '', 'g')
+    if empty(line) || line =~# '\m^[#;]'
+      continue
+    elseif line =~# '\m^\[.*\]$'
+      let glob = line[1 : -2]
+      if glob =~# '/'
+        let glob = substitute(glob, '\m^/', '', '')
+        let prefix = '/'
+      else
+        " Matches files in any directory below this one.
+        let prefix = '/\%(.*/\)\='
+      endif
+      let properties = {}
+      call add(config.sections, ['\m^' . escape(a:dir, '\.*[]~^$') . prefix
+            \ . s:glob2pattern(glob) . '$', properties])
+    elseif line =~# '\m[=:]'
+      let [name, value] =
+            \ matchlist(line, '\m^\([^=:]\{-}\)\s*[=:]\s*\(.*\)$')[1:2]
+      let name = tolower(name)
+      let value = tolower(value)
+      if empty(config.sections)
+        let config.root = name ==# 'root' && value ==# 'true'
+      else
+        let properties[name] = value
+      endif
+    endif
+  endfor
+  return config
+endfunction "}}}
+
+" The .editorconfig file in the directory, parsed again only when it
+" changed.
+function! s:config(dir) "{{{
+  let path = a:dir . '/.editorconfig'
+  let mtime = getftime(path)
+  let config = get(s:configs, a:dir, {'mtime': -2})
+  if config.mtime != mtime
+    let config = mtime < 0 || !filereadable(path)
+          \ ? {'mtime': mtime, 'root': 0, 'sections': []}
+          \ : s:parse(a:dir, path)
+    let s:configs[a:dir] = config
+  endif
+  return config
+endfunction "}}}
+
+" Returns the EditorConfig properties that apply to the file.
+function! yaifa#editorconfig#properties(path) "{{{
+  let path = fnamemodify(a:path, ':p')
+  let configs = []
+  let dir = fnamemodify(path, ':h')
+  while 1
+    let config = s:config(dir)
+    call insert(configs, config)
+    let parent = fnamemodify(dir, ':h')
+    if config.root || parent ==# dir
+      break
+    endif
+    let dir = parent
+  endwhile
+  let properties = {}
+  for config in configs
+    for [pattern, section] in config.sections
+      if path =~# pattern
+        call extend(properties, section)
+      endif
+    endfor
+  endfor
+  return properties
+endfunction "}}}
+
+" Returns the indentation set by EditorConfig for the file, like the result
+" of yaifa#analyze_lines(), or an empty dict if it does not set the indent
+" style.
+function! yaifa#editorconfig#result(path) "{{{
+  let properties = yaifa#editorconfig#properties(a:path)
+  let style = get(properties, 'indent_style', '')
+  let size = get(properties, 'indent_size', '')
+  " The tab width is the indent size unless given.
+  let tab_width =
+        \ str2nr(get(properties, 'tab_width', size ==# 'tab' ? 0 : size))
+  if style !=# 'space' && style !=# 'tab'
+    return {}
+  endif
+  let result = {'source': 'editorconfig'}
+  if tab_width > 0 && (style ==# 'tab' || has_key(properties, 'tab_width'))
+    let result.tabstop = tab_width
+  endif
+  let indent = size ==# 'tab' || empty(size) ? tab_width : str2nr(size)
+  if style ==# 'tab' && (indent == 0 || indent == tab_width)
+    let result.type = 'tab'
+    let result.indent = tab_width
+  elseif indent > 0
+    let result.type = style ==# 'tab' ? 'mixed' : 'space'
+    let result.indent = indent
+  else
+    " Spaces, but how many?
+    return {}
+  endif
+  return result
+endfunction "}}}
@@ -0,0 +1,44 @@
+" Yaifa: Yet another indent finder, almost...
+" Version: 2.1
+" Author: Israel Chauca F. <israelchauca@gmail.com>
+
+if exists('g:loaded_yaifa_histogram') && !get(g:, 'yaifa_debug', 0)
+  finish
+endif
+let g:loaded_yaifa_histogram = 1
+
+" A histogram counts the hints given by indent changes of every size. It is a
+" list indexed by the size of the change, only 2 to 8 are ever counted. Being
+" a plain list, it is stored as such by json_encode().
+let s:size = 9
+
+function! yaifa#histogram#new() "{{{
+  return repeat([0], s:size)
+endfunction "}}}
+
+" Add (or subtract, when [sign] is -1) the counts in other to the ones in
+" into, which is returned.
+function! yaifa#histogram#add(into, other, ...) "{{{
+  let sign = get(a:000, 0, 1)
+  for i in range(2, s:size - 1)
+    let a:into[i] += sign * a:other[i]
+  endfor
+  return a:into
+endfunction "}}}
+
+" Returns a new histogram with the counts of both.
+function! yaifa#histogram#merge(a, b) "{{{
+  return yaifa#histogram#add(copy(a:a), a:b)
+endfunction "}}}
+
+" Returns the histogram stored in value, e.g.: read from a cache file.
+" Anything that is not a list of numbers gives an empty one.
+function! yaifa#histogram#load(value) "{{{
+  let histogram = yaifa#histogram#new()
+  if type(a:value) == type([])
+    for i in range(min([len(a:value), s:size]))
+      let histogram[i] = type(a:value[i]) == type(0) ? a:value[i] : 0
+    endfor
+  endif
+  return histogram
+endfunction "}}}
@@ -0,0 +1,234 @@
+" Yaifa: Yet another indent finder, almost...
+" Version: 2.1
+" Author: Israel Chauca F. <israelchauca@gmail.com>
+
+if exists('g:loaded_yaifa_incremental') && !get(g:, 'yaifa_debug', 0)
+  finish
+endif
+let g:loaded_yaifa_incremental = 1
+
+" Buffers being followed, by number. Every one of them looks like:
+" {'filetype', 'line_count', 'initial', 'states', 'kinds', 'blocks',
+"  'hints', 'verdict', 'listener'}
+" states[i], kinds[i] and blocks[i] are what the i-th line left behind, see
+" yaifa#track().
+let s:tracks = get(s:, 'tracks', {})
+
+" Add or take out (sign is 1 or -1) the hint the line gave.
+function! s:count(hints, kind, state, sign) "{{{
+  if empty(a:kind)
+    return
+  endif
+  let a:hints.count += a:sign
+  if a:kind ==# 'tab'
+    let a:hints.tab += a:sign
+    return
+  endif
+  for name in a:kind ==# 'either' ? ['space', 'mixed'] : [a:kind]
+    let a:hints[name][a:state.delta] += a:sign
+  endfor
+endfunction "}}}
+
+" What the next line gets to see from the state and block left by the
+" previous one.
+function! s:key(state, block) "{{{
+  return [a:state.line, a:state.indent, a:state.length, a:state.tab,
+        \ a:state.space, a:state.mixed, a:state.tabs, a:state.spaces,
+        \ a:state.skipped, a:block]
+endfunction "}}}
+
+function! s:line_count(bufnr) "{{{
+  return get(get(getbufinfo(a:bufnr), 0, {}), 'linecount', 0)
+endfunction "}}}
+
+" Scan the whole buffer from scratch.
+function! s:scan(track, bufnr) "{{{
+  let a:track.filetype = getbufvar(a:bufnr, '&filetype')
+  let scanner = yaifa#track(a:track.filetype, {}, '', 0,
+        \ getbufline(a:bufnr, 1, '$'))
+  let a:track.line_count = s:line_count(a:bufnr)
+  let a:track.initial = yaifa#track(a:track.filetype, {}, '', 0, []).previous
+  let a:track.states = scanner.states
+  let a:track.kinds = scanner.kinds
+  let a:track.blocks = scanner.blocks
+  let a:track.hints = {'tab': scanner.tab, 'space': scanner.space,
+        \ 'mixed': scanner.mixed, 'count': scanner.hint_count}
+endfunction "}}}
+
+" Lines from first to the one before last (of the old text) were replaced by
+" added more or less lines. Scan the new ones, and the ones after them until
+" they leave things as they were.
+function! s:update(track, bufnr, first, last, added) "{{{
+  let track = a:track
+  let old_states = track.states
+  let old_kinds = track.kinds
+  let old_blocks = track.blocks
+  let old_count = len(old_states)
+  let new_count = s:line_count(a:bufnr)
+  let first = max([1, a:first])
+  let last = min([max([first, a:last]), old_count + 1])
+  if track.filetype !=# getbufvar(a:bufnr, '&filetype')
+        \ || old_count != track.line_count
+        \ || old_count + a:added != new_count
+        \ || last - first + a:added < 0
+    " Lost track of the buffer.
+    call s:scan(track, a:bufnr)
+    return
+  endif
+  let previous = first > 1 ? old_states[first - 2] : track.initial
+  let block = first > 1 ? old_blocks[first - 2] : ''
+  for index in range(first - 1, last - 2)
+    call s:count(track.hints, old_kinds[index], old_states[index], -1)
+  endfor
+  " The state after the last line seen of the new text (linenr) and after
+  " the one it corresponds to in the old text (old_linenr).
+  let linenr = last - 1 + a:added
+  let old_linenr = last - 1
+  let scanner = yaifa#track(track.filetype, previous, block, first - 1,
+        \ getbufline(a:bufnr, first, linenr))
+  let states = scanner.states
+  let kinds = scanner.kinds
+  let blocks = scanner.blocks
+  let size = 16
+  while old_linenr < old_count
+    let state = empty(states) ? previous : states[-1]
+    let block = empty(blocks) ? block : blocks[-1]
+    let old_state = old_linenr ? old_states[old_linenr - 1] : track.initial
+    let old_block = old_linenr ? old_blocks[old_linenr - 1] : ''
+    if s:key(state, block) ==# s:key(old_state, old_block)
+      break
+    endif
+    let scanner = yaifa#track(track.filetype, state, block, linenr,
+          \ getbufline(a:bufnr, linenr + 1, linenr + size))
+    if empty(scanner.states)
+      break
+    endif
+    for index in range(len(scanner.states))
+      let old_linenr += 1
+      let linenr += 1
+      call s:count(track.hints, old_kinds[old_linenr - 1],
+            \ old_states[old_linenr - 1], -1)
+      call add(states, scanner.states[index])
+      call add(kinds, scanner.kinds[index])
+      call add(blocks, scanner.blocks[index])
+      if s:key(states[-1], blocks[-1]) ==#
+            \ s:key(old_states[old_linenr - 1], old_blocks[old_linenr - 1])
+        break
+      endif
+    endfor
+    let size = min([size * 2, 1024])
+  endwhile
+  for index in range(len(states))
+    call s:count(track.hints, kinds[index], states[index], 1)
+  endfor
+  let head = first > 1 ? old_states[: first - 2] : []
+  let track.states = head + states + old_states[old_linenr :]
+  let head = first > 1 ? old_kinds[: first - 2] : []
+  let track.kinds = head + kinds + old_kinds[old_linenr :]
+  let head = first > 1 ? old_blocks[: first - 2] : []
+  let track.blocks = head + blocks + old_blocks[old_linenr :]
+  let track.line_count = new_count
+  2DebugYaifa printf('Incremental: rescanned %s lines of buffer %s',
+        \ len(states), a:bufnr)
+endfunction "}}}
+
+" Set the options again if the verdict changed and they are still what
+" Yaifa set last time.
+function! s:check(track, bufnr) "{{{
+  let defaults = yaifa#defaults(a:bufnr)
+  let result = yaifa#verdict(a:track.hints, defaults)
+  let verdict = [result.type, result.indent]
+  if verdict == a:track.verdict
+    return
+  endif
+  1DebugYaifa printf('Incremental: verdict of buffer %s went from %s to %s',
+        \ a:bufnr, string(a:track.verdict), string(verdict))
+  let a:track.verdict = verdict
+  let applied = getbufvar(a:bufnr, 'yaifa_applied')
+  if empty(applied) || applied.source !=# 'analysis'
+        \ || [applied.type, applied.indent] == verdict
+        \ || applied.options != yaifa#option_values(a:bufnr)
+    " Yaifa did not guess them or somebody else changed them afterwards.
+    return
+  endif
+  call yaifa#apply(a:bufnr, result, defaults, 1)
+endfunction "}}}
+
+function! s:on_changes(bufnr, start, end, added, changes) "{{{
+  if !has_key(s:tracks, a:bufnr)
+    return
+  endif
+  let track = s:tracks[a:bufnr]
+  " The line numbers of every change refer to the text as it was right after
+  " it, so count the lines that did not change from both ends instead.
+  let line_count = s:line_count(a:bufnr)
+  let old_count = line_count - a:added
+  let first = line_count + 1
+  let tail = line_count
+  let length = line_count
+  for change in reverse(copy(a:changes))
+    let first = min([first, change.lnum])
+    let tail = min([tail, length - (change.end + change.added) + 1])
+    let length -= change.added
+  endfor
+  call s:update(track, a:bufnr, first, old_count - tail + 1, a:added)
+  call s:check(track, a:bufnr)
+endfunction "}}}
+
+" Without listeners, the '[ and '] marks tell what changed last.
+function! s:on_text_changed(bufnr) "{{{
+  if !has_key(s:tracks, a:bufnr) || a:bufnr != bufnr('%')
+    return
+  endif
+  let track = s:tracks[a:bufnr]
+  let line_count = line('$')
+  let added = line_count - track.line_count
+  let first = line("'[")
+  let last = line("']")
+  if first < 1 || last < first
+    call s:scan(track, a:bufnr)
+  else
+    call s:update(track, a:bufnr, first, last + 1 - added, added)
+  endif
+  call s:check(track, a:bufnr)
+endfunction "}}}
+
+" Follow the changes to the buffer and set the options again if they make
+" the verdict change.
+function! yaifa#incremental#attach(bufnr) "{{{
+  call yaifa#incremental#detach(a:bufnr)
+  if !empty(getbufvar(a:bufnr, '&buftype'))
+        \ || s:line_count(a:bufnr) >
+        \   getbufvar(a:bufnr, 'yaifa_incremental_max_lines',
+        \     get(g:, 'yaifa_incremental_max_lines', 20000))
+    return
+  endif
+  let track = {}
+  call s:scan(track, a:bufnr)
+  let result = yaifa#verdict(track.hints, yaifa#defaults(a:bufnr))
+  let track.verdict = [result.type, result.indent]
+  if exists('*listener_add')
+    let track.listener =
+          \ listener_add(function('s:on_changes'), a:bufnr)
+  else
+    let track.listener = 0
+    augroup YaifaIncremental
+      execute printf('autocmd! * <buffer=%s>', a:bufnr)
+      execute printf('autocmd TextChanged,TextChangedI <buffer=%s> '
+            \ . 'call s:on_text_changed(%s)', a:bufnr, a:bufnr)
+    augroup END
+  endif
+  let s:tracks[a:bufnr] = track
+endfunction "}}}
+
+function! yaifa#incremental#detach(bufnr) "{{{
+  if !has_key(s:tracks, a:bufnr)
+    return
+  endif
+  let track = remove(s:tracks, a:bufnr)
+  if track.listener
+    call listener_remove(track.listener)
+  elseif bufexists(a:bufnr)
+    execute printf('autocmd! YaifaIncremental * <buffer=%s>', a:bufnr)
+  endif
+endfunction "}}}
@@ -0,0 +1,108 @@
+" Yaifa: Yet another indent finder, almost...
+" Version: 2.1
+" Author: Israel Chauca F. <israelchauca@gmail.com>
+
+if exists('g:loaded_yaifa_job') && !get(g:, 'yaifa_debug', 0)
+  finish
+endif
+let g:loaded_yaifa_job = 1
+
+" scp://[user@]host[:port]/path, see netrw.
+let s:scp_pattern = '\m^scp://\%(\([^@/]\+\)@\)\=\([^:#/]\+\)'
+      \ . '\%([:#]\(\d\+\)\)\=/\(.\+\)$'
+
+" Returns the command that prints the first bytes of the file, or an empty
+" list if there is no way to do it. scp:// names, as used by netrw, are read
+" through ssh.
+function! yaifa#job#command(name, bytes) "{{{
+  if has('win32') || !executable('head')
+    return []
+  endif
+  let parts = matchlist(a:name, s:scp_pattern)
+  if empty(parts)
+    if a:name =~# '\m^\a\+://' || !filereadable(a:name)
+      return []
+    endif
+    return ['head', '-c', a:bytes, '--', a:name]
+  endif
+  let [user, host, port, path] = parts[1:4]
+  if !executable('ssh')
+    return []
+  endif
+  let command = ['ssh', '-o', 'BatchMode=yes']
+  if !empty(port)
+    let command += ['-p', port]
+  endif
+  return command + [empty(user) ? host : user . '@' . host,
+        \ printf('head -c %s -- %s', a:bytes, shellescape(path))]
+endfunction "}}}
+
+function! s:feed(task, lines) "{{{
+  " Lines of files with DOS line endings keep the CR.
+  call map(a:lines, 'substitute(v:val, "\r$", "", "")')
+  let a:task.wants_more = a:task.analyzer.feed(a:lines)
+endfunction "}}}
+
+function! s:vim_out(task, channel, line) "{{{
+  if a:task.wants_more
+    call s:feed(a:task, [a:line])
+    if !a:task.wants_more
+      " Enough, no need to read the rest.
+      call job_stop(a:task.job)
+    endif
+  endif
+endfunction "}}}
+
+function! s:vim_close(task, channel) "{{{
+  call call(a:task.done, [])
+endfunction "}}}
+
+function! s:nvim_out(task, job, data, event) "{{{
+  if !a:task.wants_more || empty(a:data)
+    return
+  endif
+  " The first item completes the last line of the previous call, the last
+  " one is the beginning of a line that is not complete yet.
+  let lines = copy(a:data)
+  let lines[0] = a:task.partial . lines[0]
+  let a:task.partial = remove(lines, -1)
+  call s:feed(a:task, lines)
+  if !a:task.wants_more
+    call jobstop(a:job)
+  endif
+endfunction "}}}
+
+function! s:nvim_exit(task, job, status, event) "{{{
+  if a:task.wants_more && !empty(a:task.partial)
+    call s:feed(a:task, [a:task.partial])
+  endif
+  call call(a:task.done, [])
+endfunction "}}}
+
+" Run the command and feed its output to the analyzer (see
+" yaifa#analyzer_new()) as it comes, Done is called with no arguments once
+" it is over. Returns the job, or 0 if it could not be started.
+function! yaifa#job#start(command, analyzer, Done) "{{{
+  let task = {'analyzer': a:analyzer, 'done': a:Done, 'wants_more': 1,
+        \ 'partial': ''}
+  if has('nvim')
+    let task.job = jobstart(a:command, {
+          \ 'on_stdout': function('s:nvim_out', [task]),
+          \ 'on_exit': function('s:nvim_exit', [task])})
+    return task.job > 0 ? task.job : 0
+  elseif !has('job')
+    return 0
+  endif
+  let task.job = job_start(a:command, {'in_io': 'null', 'err_io': 'null',
+        \ 'out_mode': 'nl', 'out_cb': function('s:vim_out', [task]),
+        \ 'close_cb': function('s:vim_close', [task])})
+  return job_status(task.job) ==# 'fail' ? 0 : task.job
+endfunction "}}}
+
+function! yaifa#job#stop(job) "{{{
+  if has('nvim')
+    call jobstop(a:job)
+  else
+    call job_stop(a:job)
+  endif
+endfunction "}}}
@@ -0,0 +1,106 @@
+" Yaifa: Yet another indent finder, almost...
+" Version: 2.1
+" Author: Israel Chauca F. <israelchauca@gmail.com>
+
+if exists('g:loaded_yaifa_project') && !get(g:, 'yaifa_debug', 0)
+  finish
+endif
+let g:loaded_yaifa_project = 1
+
+" Project root by directory.
+let s:roots = get(s:, 'roots', {})
+" Hints learned by project root and filetype, every one of them looks like:
+" {'files': {path: hints}, 'hints': sum of the hints of all files}
+let s:projects = get(s:, 'projects', {})
+
+" Returns the root directory of the project the given file belongs to, or an
+" empty string if it does not seem to belong to any.
+function! yaifa#project#root(path) "{{{
+  let dir = fnamemodify(a:path, ':p:h')
+  if has_key(s:roots, dir)
+    return s:roots[dir]
+  endif
+  let markers = get(g:, 'yaifa_project_markers',
+        \ ['.git', '.hg', '.svn', '.bzr', '_darcs'])
+  let root = ''
+  let current = dir
+  while 1
+    for marker in markers
+      let candidate = current . '/' . marker
+      if isdirectory(candidate) || filereadable(candidate)
+        let root = current
+        break
+      endif
+    endfor
+    let parent = fnamemodify(current, ':h')
+    if !empty(root) || parent ==# current
+      break
+    endif
+    let current = parent
+  endwhile
+  let s:roots[dir] = root
+  return root
+endfunction "}}}
+
+function! s:project(path, filetype) "{{{
+  let root = yaifa#project#root(a:path)
+  if empty(root)
+    return {}
+  endif
+  let key = root . "\n" . a:filetype
+  if !has_key(s:projects, key)
+    let s:projects[key] = {'files': {},
+          \ 'hints': s:hints_new()}
+  endif
+  return s:projects[key]
+endfunction "}}}
+
+function! s:hints_new() "{{{
+  return {'tab': 0, 'space': yaifa#histogram#new(),
+        \ 'mixed': yaifa#histogram#new(), 'count': 0}
+endfunction "}}}
+
+" Add (or subtract, when sign is -1) the hints in b to the ones in a.
+function! s:add(a, b, sign) "{{{
+  let a:a.tab += a:sign * a:b.tab
+  let a:a.count += a:sign * a:b.count
+  call yaifa#histogram#add(a:a.space, a:b.space, a:sign)
+  call yaifa#histogram#add(a:a.mixed, a:b.mixed, a:sign)
+  return a:a
+endfunction "}}}
+
+function! yaifa#project#merge(a, b) "{{{
+  return s:add(s:add(s:hints_new(), a:a, 1), a:b, 1)
+endfunction "}}}
+
+" Remember the hints found in the given file. A file seen before replaces its
+" old hints.
+function! yaifa#project#learn(path, filetype, hints) "{{{
+  let project = s:project(a:path, a:filetype)
+  if empty(project)
+    return
+  endif
+  let path = fnamemodify(a:path, ':p')
+  if has_key(project.files, path)
+    call s:add(project.hints, project.files[path], -1)
+  endif
+  let project.files[path] = a:hints
+  call s:add(project.hints, a:hints, 1)
+endfunction "}}}
+
+" Returns the hints learned from the other files of the same project and
+" filetype, or an empty dict if there are none.
+function! yaifa#project#prior(path, filetype) "{{{
+  let project = s:project(a:path, a:filetype)
+  if empty(project)
+    return {}
+  endif
+  let path = fnamemodify(a:path, ':p')
+  let hints = project.hints
+  if has_key(project.files, path)
+    " Don't count the file itself.
+    let hints = s:add(s:add(s:hints_new(), hints, 1), project.files[path],
+          \ -1)
+  endif
+  return hints.count > 0 ? hints : {}
+endfunction "}}}
@@ -0,0 +1,188 @@
+" Yaifa: Yet another indent finder, almost...
+" Version: 2.1
+" Author: Israel Chauca F. <israelchauca@gmail.com>
+
+if exists('g:loaded_yaifa_syntax') && !get(g:, 'yaifa_debug', 0)
+  finish
+endif
+let g:loaded_yaifa_syntax = 1
+
+" Lines never have a newline, so this never matches.
+let s:never = '\n'
+" How comments and line continuations look like, by filetype:
+" comment: the comment leaders.
+" continues: pattern that matches a line that continues on the next one.
+" continued: pattern that matches a line that continues the previous one.
+" blocks: list of [start, end] patterns of blocks that can span several
+" lines, like block comments, strings or heredocs. \1, \2... in the end
+" pattern stand for the text matched by the groups of the start pattern.
+let s:c_block = ['/\*', '\*/']
+let s:c = {'comment': ['/*', '*', '//'], 'continues': '\\$',
+      \ 'blocks': [s:c_block]}
+let s:c_hash = {'comment': ['/*', '*', '//', '#'], 'continues': '\\$',
+      \ 'blocks': [s:c_block]}
+let s:sh = {'comment': ['#'], 'continues': '\\$',
+      \ 'blocks': [['\%(^\|[^<]\)<<-\=\s*\([''"]\=\)\(\h\w*\)\1',
+      \   '^\t*\2$']]}
+let s:hash = {'comment': ['#'], 'continues': '\\$'}
+let s:dash = {'comment': ['--']}
+let s:lisp = {'comment': [';'], 'blocks': [['#|', '|#']]}
+let s:builtin = {
+      \ '': s:c_hash,
+      \ 'vim': {'comment': ['"'], 'continued': '^\s*\\',
+      \   'blocks': [['=<<\s*\%(\%(trim\|eval\)\s\+\)*\(\h\w*\)',
+      \     '^\s*\1$']]},
+      \ 'c': s:c_hash, 'cpp': s:c_hash, 'objc': s:c_hash,
+      \ 'cs': s:c, 'java': s:c, 'javascript': s:c, 'typescript': s:c,
+      \ 'go': s:c, 'rust': s:c, 'swift': s:c, 'kotlin': s:c, 'scala': s:c,
+      \ 'dart': s:c, 'css': s:c, 'scss': s:c, 'less': s:c, 'groovy': s:c,
+      \ 'php': {'comment': ['/*', '*', '//', '#'], 'continues': '\\$',
+      \   'blocks': [s:c_block,
+      \     ['<<<\s*\([''"]\=\)\(\h\w*\)\1', '^\s*\2\>']]},
+      \ 'python': {'comment': ['#'], 'continues': '\\$',
+      \   'blocks': [['"""', '"""'], ["'''", "'''"]]},
+      \ 'sh': s:sh, 'bash': s:sh, 'zsh': s:sh,
+      \ 'ruby': {'comment': ['#'], 'continues': '\\$',
+      \   'blocks': [['^=begin\>', '^=end\>'],
+      \     ['<<[-~]\=\([''"]\=\)\(\h\w*\)\1', '^\s*\2$']]},
+      \ 'perl': {'comment': ['#'], 'continues': '\\$',
+      \   'blocks': [['^=\a', '^=cut\>'],
+      \     ['<<\([''"]\=\)\(\h\w*\)\1', '^\2$']]},
+      \ 'make': s:hash, 'cmake': s:hash, 'tcl': s:hash,
+      \ 'dockerfile': s:hash, 'awk': s:hash, 'r': s:hash,
+      \ 'yaml': {'comment': ['#']}, 'toml': {'comment': ['#']},
+      \ 'conf': {'comment': ['#']},
+      \ 'nix': {'comment': ['#', '/*', '*'], 'blocks': [s:c_block]},
+      \ 'lua': {'comment': ['--'], 'blocks': [['\[\(=*\)\[', '\]\1\]']]},
+      \ 'ada': s:dash, 'elm': {'comment': ['--'], 'blocks': [['{-', '-}']]},
+      \ 'haskell': {'comment': ['--', '{-'], 'blocks': [['{-', '-}']]},
+      \ 'sql': {'comment': ['--', '/*', '*'], 'blocks': [s:c_block]},
+      \ 'lisp': s:lisp, 'scheme': s:lisp, 'racket': s:lisp,
+      \ 'clojure': {'comment': [';']},
+      \ 'tex': {'comment': ['%']}, 'erlang': {'comment': ['%']},
+      \ 'matlab': {'comment': ['%'], 'continues': '\.\.\.$',
+      \   'blocks': [['^\s*%{\s*$', '^\s*%}\s*$']]},
+      \ 'octave': {'comment': ['%', '#'], 'continues': '\.\.\.$',
+      \   'blocks': [['^\s*[%#]{\s*$', '^\s*[%#]}\s*$']]},
+      \ 'fortran': {'comment': ['!'], 'continues': '&$'},
+      \ 'vb': {'comment': ["'"], 'continues': ' _$'},
+      \ 'ocaml': {'comment': ['(*'], 'blocks': [['(\*', '\*)']]},
+      \ 'fsharp': {'comment': ['(*', '//'], 'blocks': [['(\*', '\*)']]},
+      \ }
+" Compiled patterns, by filetype.
+let s:cache = get(s:, 'cache', {})
+
+function! s:leader_pattern(leader) "{{{
+  return escape(a:leader, '\.*[]~^$')
+endfunction "}}}
+
+" Pattern for a line that could leave the block open. Blocks closed on the
+" same line do not match, unless the end depends on the start.
+function! s:opens(start, end) "{{{
+  let pattern = '\%(' . a:start . '\)'
+  if a:end !~# '\m\\\d'
+    let pattern .= '\%(.*' . a:end . '\)\@!'
+  endif
+  return pattern
+endfunction "}}}
+
+function! s:compile(spec) "{{{
+  let blocks = get(a:spec, 'blocks', [])
+  let leaders = map(copy(get(a:spec, 'comment', [])),
+        \ 'type(v:val) == type([]) ? v:val[0] : s:leader_pattern(v:val)')
+  let compiled = {
+        \ 'comment': empty(leaders) ? s:never
+        \   : '\m^\s*\%(' . join(leaders, '\|') . '\)',
+        \ 'continues': '\m' . get(a:spec, 'continues', s:never),
+        \ 'continued': '\m' . get(a:spec, 'continued', s:never),
+        \ 'opens': empty(blocks) ? s:never
+        \   : '\m' . join(map(copy(blocks), 's:opens(v:val[0], v:val[1])'),
+        \     '\|'),
+        \ 'blocks': map(copy(blocks), '[''\m'' . v:val[0], v:val[1]]'),
+        \ }
+  let compiled.special = compiled.comment . '\|' . compiled.opens
+  return compiled
+endfunction "}}}
+
+" Returns the pattern that ends the block the line leaves open, if any.
+function! yaifa#syntax#block_end(line, blocks) "{{{
+  let start = 0
+  while 1
+    " Find the block that starts first.
+    let first = ['', -1, -1]
+    let found = []
+    for [block_start, block_end] in a:blocks
+      let match = matchstrpos(a:line, block_start, start)
+      if match[1] >= 0 && (first[1] < 0 || match[1] < first[1])
+        let first = match
+        let found = [block_start, block_end]
+      endif
+    endfor
+    if empty(found)
+      return ''
+    endif
+    let block_end = found[1]
+    if block_end =~# '\m\\\d'
+      " The end depends on what was matched at the start, e.g.: heredocs.
+      let groups = matchlist(a:line, found[0], first[1])
+      let block_end = substitute(block_end, '\m\\\(\d\)',
+            \ '\=escape(groups[submatch(1)], ''\.*[]~^$'')', 'g')
+    endif
+    let block_end = '\m' . block_end
+    let start = matchend(a:line, block_end, first[2])
+    if start < 0
+      return block_end
+    endif
+  endwhile
+endfunction "}}}
+
+" The comment leaders of the buffer, from 'comments' and 'commentstring'.
+" List bullets (the 'f' flag) are left out. Leaders that need a blank after
+" them are given as a list with the pattern for that.
+function! s:buffer_spec(bufnr) "{{{
+  let comments = getbufvar(a:bufnr, '&comments')
+  if comments ==# &g:comments
+    " No filetype plugin took care of it.
+    return {}
+  endif
+  let leaders = []
+  for part in split(comments, '\m\\\@<!,')
+    let [flags, leader] = matchlist(part, '\m^\([^:]*\):\(.*\)$')[1:2]
+    let leader = substitute(leader, '\m\\,', ',', 'g')
+    if flags =~# 'f' || empty(leader)
+      continue
+    endif
+    call add(leaders, flags =~# 'b'
+          \ ? [s:leader_pattern(leader) . '\%(\s\|$\)'] : leader)
+  endfor
+  let commentstring = matchstr(getbufvar(a:bufnr, '&commentstring'),
+        \ '\m^\s*\zs.\{-}\ze\s*%s')
+  if !empty(commentstring) && index(leaders, commentstring) < 0
+    call add(leaders, commentstring)
+  endif
+  return {'comment': leaders, 'continues': '\\$'}
+endfunction "}}}
+
+" Returns the patterns for comments and line continuations of the filetype,
+" the ones set by the user in g:yaifa_syntax first. The buffer, if given, is
+" used for filetypes Yaifa knows nothing about.
+function! yaifa#syntax#get(filetype, ...) "{{{
+  let user = get(g:, 'yaifa_syntax', {})
+  if has_key(user, a:filetype)
+    return s:compile(user[a:filetype])
+  endif
+  if has_key(s:cache, a:filetype)
+    return s:cache[a:filetype]
+  endif
+  let spec = get(s:builtin, a:filetype, {})
+  if empty(spec) && a:0 && a:1 && !empty(a:filetype)
+    let spec = s:buffer_spec(a:1)
+  endif
+  if empty(spec)
+    " Go with the most common ones, but do not remember it: a buffer could
+    " tell something better later.
+    return s:compile(s:builtin[''])
+  endif
+  let s:cache[a:filetype] = s:compile(spec)
+  return s:cache[a:filetype]
+endfunction "}}}
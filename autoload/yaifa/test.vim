@@ -0,0 +1,73 @@
+" Yaifa: Yet another indent finder, almost...
+" Version: 2.1
+" Author: Israel Chauca F. <israelchauca@gmail.com>
+
+if exists('g:loaded_yaifa_test') && !get(g:, 'yaifa_debug', 0)
+  finish
+endif
+let g:loaded_yaifa_test = 1
+
+let s:script_dir = expand('<sfile>:p:h:h:h')
+
+function! s:start(command) "{{{
+  if has('nvim')
+    return jobstart(a:command)
+  endif
+  return job_start(a:command,
+        \ {'in_io': 'null', 'out_io': 'null', 'err_io': 'null'})
+endfunction "}}}
+
+function! s:wait(jobs) "{{{
+  if has('nvim')
+    call jobwait(a:jobs)
+    return
+  endif
+  while !empty(filter(copy(a:jobs), 'job_status(v:val) ==# "run"'))
+    sleep 10m
+  endwhile
+endfunction "}}}
+
+" Check the tests, [file, type, value] lists, in as many headless Vim
+" processes as workers and return their results in the same order, see
+" yaifa#test_file().
+function! yaifa#test#parallel(tests, workers) "{{{
+  let chunks = map(range(min([a:workers, len(a:tests)])), '[]')
+  for index in range(len(a:tests))
+    " Every directory has files of all sizes, deal them like cards.
+    call add(chunks[index % len(chunks)], a:tests[index])
+  endfor
+  let jobs = []
+  let outputs = []
+  for chunk in chunks
+    let input = tempname()
+    let output = tempname()
+    call writefile([json_encode(chunk)], input)
+    call add(jobs, s:start([v:progpath, '-Nu', 'NONE', '-i', 'NONE', '-es',
+          \ '--cmd', 'set rtp^=' . fnameescape(s:script_dir),
+          \ '-c', 'runtime plugin/yaifa.vim',
+          \ '-c', printf('call yaifa#test#worker(%s, %s)',
+          \   string(input), string(output)),
+          \ '-c', 'qa!']))
+    call add(outputs, [input, output])
+  endfor
+  call s:wait(jobs)
+  let results = {}
+  for [input, output] in outputs
+    if !filereadable(output)
+      throw printf('Yaifa: a test worker failed, see %s.', input)
+    endif
+    for result in json_decode(join(readfile(output), ''))
+      let results[result.path] = result
+    endfor
+    call delete(input)
+    call delete(output)
+  endfor
+  return map(copy(a:tests), 'results[v:val[0]]')
+endfunction "}}}
+
+" What every process started by yaifa#test#parallel() does.
+function! yaifa#test#worker(input, output) "{{{
+  let tests = json_decode(join(readfile(a:input), ''))
+  call writefile([json_encode(map(tests,
+        \ 'yaifa#test_file(v:val[0], v:val[1], v:val[2])'))], a:output)
+endfunction "}}}
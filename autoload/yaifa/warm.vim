@@ -0,0 +1,162 @@
+" Yaifa: Yet another indent finder, almost...
+" Version: 2.1
+" Author: Israel Chauca F. <israelchauca@gmail.com>
+
+if exists('g:loaded_yaifa_warm') && !get(g:, 'yaifa_debug', 0)
+  finish
+endif
+let g:loaded_yaifa_warm = 1
+
+" Running warm ups by directory, every one of them looks like:
+" {'dir', 'files': [path, ...], 'next': index of the next file,
+"  'defaults', 'timer', 'start_time', 'shown': when the progress was shown,
+"  'stored', 'fresh', 'skipped', 'lines'}
+let s:runs = get(s:, 'runs', {})
+" Runs waiting for others to finish, see 'yaifa_warm_concurrency'.
+let s:queue = get(s:, 'queue', [])
+
+" The files of the directory Git does not ignore, or an empty list if it is
+" not a Git work tree.
+function! s:git_files(dir) "{{{
+  if !executable('git')
+    return []
+  endif
+  let files = systemlist(printf(
+        \ 'git -C %s -c core.quotepath=off ls-files -co --exclude-standard',
+        \ shellescape(a:dir)))
+  if v:shell_error
+    return []
+  endif
+  return map(files, 'a:dir . "/" . v:val')
+endfunction "}}}
+
+" The files to analyze in the directory and below it. 'wildignore' and
+" hidden files are skipped when Git can not tell which ones to ignore.
+function! s:files(dir) "{{{
+  let files = s:git_files(a:dir)
+  if empty(files)
+    let files = glob(a:dir . '/**/*', 0, 1)
+  endif
+  return filter(files, 'filereadable(v:val)')
+endfunction "}}}
+
+function! s:report(run, message) "{{{
+  redraw
+  echomsg printf('Yaifa: %s: %s', fnamemodify(a:run.dir, ':~'), a:message)
+endfunction "}}}
+
+" Analyze files until the time slice is over.
+function! s:tick(run, timer) "{{{
+  let start_time = reltime()
+  let budget = get(g:, 'yaifa_warm_budget', 20) / 1000.0
+  let total = len(a:run.files)
+  while a:run.next < total
+        \ && reltimefloat(reltime(start_time)) < budget
+    let path = a:run.files[a:run.next]
+    let a:run.next += 1
+    let size = getfsize(path)
+    let filetype = yaifa#batch#filetype(path)
+    let settings = yaifa#cache#settings(filetype, a:run.defaults)
+    if !empty(yaifa#cache#get(path, settings))
+      let a:run.fresh += 1
+      continue
+    elseif size < 0 || (a:run.defaults.large_file[0] > 0
+          \ && size > a:run.defaults.large_file[0])
+      " Too big to read ahead of time.
+      let a:run.skipped += 1
+      continue
+    endif
+    let result = yaifa#batch#analyze(path, filetype, a:run.defaults)
+    if result.binary
+      let a:run.skipped += 1
+      continue
+    endif
+    call yaifa#cache#put(path, settings, result, 0)
+    let a:run.stored += 1
+    let a:run.lines += result.read
+  endwhile
+  if a:run.next < total
+    if reltimefloat(reltime(a:run.shown)) > 0.5
+      let a:run.shown = reltime()
+      echo printf('Yaifa: warming up %s: %s/%s files',
+            \ fnamemodify(a:run.dir, ':~'), a:run.next, total)
+    endif
+    return
+  endif
+  call yaifa#warm#stop(a:run.dir)
+  call yaifa#cache#flush()
+  call s:next()
+  let elapsed = reltimefloat(reltime(a:run.start_time))
+  call s:report(a:run, printf('%s files analyzed, %s already cached and %s '
+        \ . 'skipped in %.2f seconds, %.0f files/s, %.0f lines/s',
+        \ a:run.stored, a:run.fresh, a:run.skipped, elapsed,
+        \ elapsed > 0 ? a:run.stored / elapsed : 0.0,
+        \ elapsed > 0 ? a:run.lines / elapsed : 0.0))
+endfunction "}}}
+
+" Analyze the files in the directory in the background and keep the results
+" in the cache, so opening them later costs nothing. Returns the number of
+" files to analyze.
+function! yaifa#warm#start(dir) "{{{
+  if !has('timers')
+    echoerr 'Yaifa: warming up needs the +timers feature.'
+    return 0
+  endif
+  let dir = fnamemodify(empty(a:dir) ? getcwd() : expand(a:dir), ':p')
+  let dir = substitute(dir, '\m.\zs/$', '', '')
+  if !isdirectory(dir)
+    echoerr printf('Yaifa: %s is not a directory.', a:dir)
+    return 0
+  endif
+  call yaifa#warm#stop(dir)
+  if !yaifa#cache#enabled()
+    " There is no cache directory, but the results can still be used while
+    " Vim runs.
+    call yaifa#cache#use_memory()
+  endif
+  let run = {'dir': dir, 'files': s:files(dir), 'next': 0, 'stored': 0,
+        \ 'fresh': 0, 'skipped': 0, 'lines': 0}
+  " Results over the size of the cache would push out the first ones when
+  " it is saved, see yaifa#cache#flush().
+  let max_files = get(g:, 'yaifa_cache_size', 1000) * 9 / 10
+  if len(run.files) > max_files
+    call s:report(run, printf('only the first %s of %s files fit in the '
+          \ . 'cache, see ''yaifa_cache_size''', max_files, len(run.files)))
+    call remove(run.files, max_files, -1)
+  endif
+  " No buffer, only the global settings count.
+  let run.defaults = yaifa#defaults(-1)
+  " Every file gets the patterns of its own filetype.
+  call remove(run.defaults, 'syntax')
+  let run.defaults.synid = 0
+  call add(s:queue, run)
+  1DebugYaifa printf('Warm: %s files in %s', len(run.files), dir)
+  call s:next()
+  if !has_key(s:runs, dir)
+    call s:report(run, 'waiting for other directories')
+  endif
+  return len(run.files)
+endfunction "}}}
+
+" Start the runs in the queue while there is room for them.
+function! s:next() "{{{
+  while !empty(s:queue)
+        \ && len(s:runs) < max([1, get(g:, 'yaifa_warm_concurrency', 2)])
+    let run = remove(s:queue, 0)
+    let run.start_time = reltime()
+    let run.shown = run.start_time
+    let run.timer = timer_start(get(g:, 'yaifa_warm_interval', 10),
+          \ function('s:tick', [run]), {'repeat': -1})
+    let s:runs[run.dir] = run
+  endwhile
+endfunction "}}}
+
+" Stop warming up the directory, or all of them if none is given.
+function! yaifa#warm#stop(...) "{{{
+  call filter(s:queue, 'a:0 && v:val.dir !=# a:1')
+  for dir in a:0 ? [a:1] : keys(s:runs)
+    if has_key(s:runs, dir)
+      call timer_stop(remove(s:runs, dir).timer)
+    endif
+  endfor
+endfunction "}}}
@@ -13,34 +13,53 @@ function! s:log(level, message) "{{{
   endif
 endfunction "}}}
 
-function! s:apply_settings(force, bufnr) "{{{
+function! s:apply_settings(force, bufnr, async) "{{{
   " Does the user wants it ignored?
   let skip_it = get(b:, 'yaifa_disabled', get(g:, 'yaifa_disabled', 0))
   if !a:force && skip_it
     " Seems like we are skipping this buffer
     return
   endif
-  if has('job')
+  let job_pattern =
+        \ get(b:, 'yaifa_job_pattern', get(g:, 'yaifa_job_pattern', ''))
+  if a:async && !empty(job_pattern) && bufname(a:bufnr) =~# job_pattern
+        \ && yaifa#magic_job(a:bufnr)
+    " Slow to read, let a job do it.
+  elseif a:async && has('timers') && get(g:, 'yaifa_async', 1)
     " We can be a bit slow on big files, this should mask it.
-    if has('nvim')
-      " Neovim
-      call jobstart(yaifa#magic(a:bufnr))
-    else
-      " Vim
-      call job_start(yaifa#magic(a:bufnr))
-    endif
+    call yaifa#magic_async(a:bufnr)
   else
     call yaifa#magic(a:bufnr)
   endif
+  if get(b:, 'yaifa_incremental', get(g:, 'yaifa_incremental', 0))
+    " Keep an eye on the changes to the buffer.
+    call yaifa#incremental#attach(a:bufnr)
+  endif
 endfunction "}}}
 
 augroup Yaifa
   au!
-  au BufReadPost * call s:apply_settings(0, bufnr('%'))
+  au BufReadPost * call s:apply_settings(0, bufnr('%'), 1)
+  " New files can only learn from the rest of the project.
+  au BufNewFile * if get(g:, 'yaifa_project', 0)
+        \ | call s:apply_settings(0, bufnr('%'), 0) | endif
+  " Only needed if there could be something to cancel.
+  au BufWipeout * if exists('*yaifa#cancel')
+        \ | call yaifa#cancel(str2nr(expand('<abuf>'))) | endif
+  au BufWipeout * if exists('*yaifa#incremental#detach')
+        \ | call yaifa#incremental#detach(str2nr(expand('<abuf>'))) | endif
+  au VimLeavePre * if exists('*yaifa#cache#flush')
+        \ | call yaifa#cache#flush() | endif
 augroup End
 
-command! -nargs=0 -bar -bang Yaifa call s:apply_settings(<bang>0, bufnr('%'))
-command! -bar TestYaifa call yaifa#test()
+command! -nargs=0 -bar -bang Yaifa
+      \ call s:apply_settings(<bang>0, bufnr('%'), 0)
+command! -bar -count=1 TestYaifa call yaifa#test(<count>)
+command! -bar -bang -count=10 YaifaBench
+      \ call yaifa#bench#run({'runs': <count>, 'save': <bang>0})
+command! -bar -bang -nargs=? -complete=dir YaifaWarm
+      \ if <bang>0 | call yaifa#warm#stop() | else
+      \ | call yaifa#warm#start(<q-args>) | endif
 if get(g:, 'yaifa_debug', 0)
   function! s:l2str(line) "{{{
     if a:line.tab
@@ -0,0 +1,834 @@
+/* vi:set ts=8 sts=4 sw=4:
+ *
+ * accessors.c: small getters first, the nested code further down.
+ *
+ * Only the code after the getters is indented deep enough to use tabs,
+ * the first screenful looks like plain four space indentation.
+ */
+
+#include "vim.h"
+
+static int	values[20];
+
+    int
+get_width(void)
+{
+    int	value = values[0];
+
+    value += 1;
+    return value;
+}
+
+    int
+get_height(void)
+{
+    int	value = values[1];
+
+    value += 2;
+    return value;
+}
+
+    int
+get_rows(void)
+{
+    int	value = values[2];
+
+    value += 3;
+    return value;
+}
+
+    int
+get_columns(void)
+{
+    int	value = values[3];
+
+    value += 4;
+    return value;
+}
+
+    int
+get_top(void)
+{
+    int	value = values[4];
+
+    value += 5;
+    return value;
+}
+
+    int
+get_bottom(void)
+{
+    int	value = values[5];
+
+    value += 6;
+    return value;
+}
+
+    int
+get_left(void)
+{
+    int	value = values[6];
+
+    value += 7;
+    return value;
+}
+
+    int
+get_right(void)
+{
+    int	value = values[7];
+
+    value += 8;
+    return value;
+}
+
+    int
+get_first(void)
+{
+    int	value = values[8];
+
+    value += 9;
+    return value;
+}
+
+    int
+get_last(void)
+{
+    int	value = values[9];
+
+    if (value < 0)
+	return 0;
+    value += 10;
+    return value;
+}
+
+    int
+get_count(void)
+{
+    int	value = values[10];
+
+    value += 11;
+    return value;
+}
+
+    int
+get_flags(void)
+{
+    int	value = values[11];
+
+    value += 12;
+    return value;
+}
+
+    int
+get_state(void)
+{
+    int	value = values[12];
+
+    value += 13;
+    return value;
+}
+
+    int
+get_mode(void)
+{
+    int	value = values[13];
+
+    value += 14;
+    return value;
+}
+
+    int
+get_level(void)
+{
+    int	value = values[14];
+
+    value += 15;
+    return value;
+}
+
+    int
+get_depth(void)
+{
+    int	value = values[15];
+
+    value += 16;
+    return value;
+}
+
+    int
+get_offset(void)
+{
+    int	value = values[16];
+
+    value += 17;
+    return value;
+}
+
+    int
+get_length(void)
+{
+    int	value = values[17];
+
+    value += 18;
+    return value;
+}
+
+    int
+get_start(void)
+{
+    int	value = values[18];
+
+    value += 19;
+    return value;
+}
+
+    int
+get_end(void)
+{
+    int	value = values[19];
+
+    value += 20;
+    return value;
+}
+
+    void
+check_width_0(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[0])
+	{
+	    list[idx] = 0;
+	    if (idx > 0)
+		break;
+	}
+    }
+}
+
+    void
+check_height_1(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[1])
+	{
+	    list[idx] = 0;
+	    if (idx > 1)
+		break;
+	}
+    }
+}
+
+    void
+check_rows_2(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[2])
+	{
+	    list[idx] = 0;
+	    if (idx > 2)
+		break;
+	}
+    }
+}
+
+    void
+check_columns_3(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[3])
+	{
+	    list[idx] = 0;
+	    if (idx > 3)
+		break;
+	}
+    }
+}
+
+    void
+check_top_4(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[4])
+	{
+	    list[idx] = 0;
+	    if (idx > 4)
+		break;
+	}
+    }
+}
+
+    void
+check_bottom_5(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[5])
+	{
+	    list[idx] = 0;
+	    if (idx > 5)
+		break;
+	}
+    }
+}
+
+    void
+check_left_6(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[6])
+	{
+	    list[idx] = 0;
+	    if (idx > 6)
+		break;
+	}
+    }
+}
+
+    void
+check_right_7(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[7])
+	{
+	    list[idx] = 0;
+	    if (idx > 7)
+		break;
+	}
+    }
+}
+
+    void
+check_first_8(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[8])
+	{
+	    list[idx] = 0;
+	    if (idx > 8)
+		break;
+	}
+    }
+}
+
+    void
+check_last_9(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[9])
+	{
+	    list[idx] = 0;
+	    if (idx > 9)
+		break;
+	}
+    }
+}
+
+    void
+check_count_10(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[10])
+	{
+	    list[idx] = 0;
+	    if (idx > 10)
+		break;
+	}
+    }
+}
+
+    void
+check_flags_11(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[11])
+	{
+	    list[idx] = 0;
+	    if (idx > 11)
+		break;
+	}
+    }
+}
+
+    void
+check_state_12(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[12])
+	{
+	    list[idx] = 0;
+	    if (idx > 12)
+		break;
+	}
+    }
+}
+
+    void
+check_mode_13(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[13])
+	{
+	    list[idx] = 0;
+	    if (idx > 13)
+		break;
+	}
+    }
+}
+
+    void
+check_level_14(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[14])
+	{
+	    list[idx] = 0;
+	    if (idx > 14)
+		break;
+	}
+    }
+}
+
+    void
+check_depth_15(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[15])
+	{
+	    list[idx] = 0;
+	    if (idx > 15)
+		break;
+	}
+    }
+}
+
+    void
+check_offset_16(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[16])
+	{
+	    list[idx] = 0;
+	    if (idx > 16)
+		break;
+	}
+    }
+}
+
+    void
+check_length_17(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[17])
+	{
+	    list[idx] = 0;
+	    if (idx > 17)
+		break;
+	}
+    }
+}
+
+    void
+check_start_18(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[18])
+	{
+	    list[idx] = 0;
+	    if (idx > 18)
+		break;
+	}
+    }
+}
+
+    void
+check_end_19(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[19])
+	{
+	    list[idx] = 0;
+	    if (idx > 19)
+		break;
+	}
+    }
+}
+
+    void
+check_width_20(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[0])
+	{
+	    list[idx] = 0;
+	    if (idx > 20)
+		break;
+	}
+    }
+}
+
+    void
+check_height_21(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[1])
+	{
+	    list[idx] = 0;
+	    if (idx > 21)
+		break;
+	}
+    }
+}
+
+    void
+check_rows_22(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[2])
+	{
+	    list[idx] = 0;
+	    if (idx > 22)
+		break;
+	}
+    }
+}
+
+    void
+check_columns_23(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[3])
+	{
+	    list[idx] = 0;
+	    if (idx > 23)
+		break;
+	}
+    }
+}
+
+    void
+check_top_24(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[4])
+	{
+	    list[idx] = 0;
+	    if (idx > 24)
+		break;
+	}
+    }
+}
+
+    void
+check_bottom_25(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[5])
+	{
+	    list[idx] = 0;
+	    if (idx > 25)
+		break;
+	}
+    }
+}
+
+    void
+check_left_26(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[6])
+	{
+	    list[idx] = 0;
+	    if (idx > 26)
+		break;
+	}
+    }
+}
+
+    void
+check_right_27(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[7])
+	{
+	    list[idx] = 0;
+	    if (idx > 27)
+		break;
+	}
+    }
+}
+
+    void
+check_first_28(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[8])
+	{
+	    list[idx] = 0;
+	    if (idx > 28)
+		break;
+	}
+    }
+}
+
+    void
+check_last_29(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[9])
+	{
+	    list[idx] = 0;
+	    if (idx > 29)
+		break;
+	}
+    }
+}
+
+    void
+check_count_30(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[10])
+	{
+	    list[idx] = 0;
+	    if (idx > 30)
+		break;
+	}
+    }
+}
+
+    void
+check_flags_31(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[11])
+	{
+	    list[idx] = 0;
+	    if (idx > 31)
+		break;
+	}
+    }
+}
+
+    void
+check_state_32(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[12])
+	{
+	    list[idx] = 0;
+	    if (idx > 32)
+		break;
+	}
+    }
+}
+
+    void
+check_mode_33(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[13])
+	{
+	    list[idx] = 0;
+	    if (idx > 33)
+		break;
+	}
+    }
+}
+
+    void
+check_level_34(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[14])
+	{
+	    list[idx] = 0;
+	    if (idx > 34)
+		break;
+	}
+    }
+}
+
+    void
+check_depth_35(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[15])
+	{
+	    list[idx] = 0;
+	    if (idx > 35)
+		break;
+	}
+    }
+}
+
+    void
+check_offset_36(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[16])
+	{
+	    list[idx] = 0;
+	    if (idx > 36)
+		break;
+	}
+    }
+}
+
+    void
+check_length_37(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[17])
+	{
+	    list[idx] = 0;
+	    if (idx > 37)
+		break;
+	}
+    }
+}
+
+    void
+check_start_38(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[18])
+	{
+	    list[idx] = 0;
+	    if (idx > 38)
+		break;
+	}
+    }
+}
+
+    void
+check_end_39(int *list, int len)
+{
+    int		idx;
+
+    for (idx = 0; idx < len; ++idx)
+    {
+	if (list[idx] == values[19])
+	{
+	    list[idx] = 0;
+	    if (idx > 39)
+		break;
+	}
+    }
+}
+